@@ -1,15 +1,28 @@
-from flask import Flask, request, jsonify, send_from_directory, redirect, url_for
+from flask import Flask, Response, request, jsonify, send_from_directory, redirect, url_for, stream_with_context
 from flask_cors import CORS
-from flask_login import login_user, logout_user
+from flask_login import login_user, logout_user, current_user
 import db
 from master import process_site
-from queue_interface import get_queue
+from queue_interface import get_queue, FileQueue, get_azure_credential
 import asyncio
+import heapq
 import os
+import sys
+import threading
 import time
 from datetime import datetime, timedelta
-import json
+import logging
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+import requests
+from requests.adapters import HTTPAdapter
 import auth
+from cache import TTLCache
+from logging_setup import configure_logging
+
+configure_logging()
+log = logging.getLogger('api')
 
 app = Flask(__name__, static_folder='static')
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key-change-in-production')
@@ -26,6 +39,26 @@ event_loop = None
 # Track when master started
 master_started_at = datetime.utcnow()
 
+# Per-user response caches for the endpoints the dashboard polls
+_me_cache = TTLCache(maxsize=10000, ttl=30)
+_sites_cache = TTLCache(maxsize=10000, ttl=10)
+_status_cache = TTLCache(maxsize=10000, ttl=10)
+
+# Remote queue status (Service Bus peek / Storage properties) is slow; share it briefly
+_queue_status_cache = TTLCache(maxsize=16, ttl=5)
+
+def ojsonify(obj, status=200):
+    """
+    jsonify() replacement for large list responses, serialized by orjson (C).
+    Naive datetimes are emitted in the same ISO format as .isoformat().
+    """
+    return Response(orjson.dumps(obj), status=status, mimetype='application/json')
+
+def _invalidate_site_caches(user_id):
+    """Drop cached site lists/status for a user after their sites change"""
+    _sites_cache.pop(user_id)
+    _status_cache.pop(user_id)
+
 # ========== Authentication Routes ==========
 
 @app.route('/login')
@@ -59,30 +92,30 @@ def github_login():
     if not auth.github:
         return jsonify({'error': 'GitHub OAuth not configured'}), 500
     redirect_uri = url_for('github_callback', _external=True)
-    print(f"[AUTH] GitHub OAuth redirect_uri: {redirect_uri}")
+    log.debug("[AUTH] GitHub OAuth redirect_uri: %s", redirect_uri)
     return auth.github.authorize_redirect(redirect_uri)
 
 
 @app.route('/auth/github/callback')
 def github_callback():
     """Handle GitHub OAuth callback"""
-    print("[AUTH] GitHub callback received")
+    log.debug("[AUTH] GitHub callback received")
     if not auth.github:
-        print("[AUTH] GitHub OAuth not configured")
+        log.warning("[AUTH] GitHub OAuth not configured")
         return jsonify({'error': 'GitHub OAuth not configured'}), 500
 
     try:
-        print("[AUTH] Authorizing GitHub access token...")
+        log.debug("[AUTH] Authorizing GitHub access token...")
         token = auth.github.authorize_access_token()
-        print("[AUTH] Getting GitHub user info...")
+        log.debug("[AUTH] Getting GitHub user info...")
         resp = auth.github.get('user', token=token)
         user_info = resp.json()
-        print(f"[AUTH] GitHub user info received: {user_info.get('login')}, id={user_info.get('id')}")
+        log.debug("[AUTH] GitHub user info received: %s, id=%s", user_info.get('login'), user_info.get('id'))
 
         # Get user email (may require additional API call)
         email = user_info.get('email')
         if not email:
-            print("[AUTH] Email not in user info, fetching from /user/emails...")
+            log.debug("[AUTH] Email not in user info, fetching from /user/emails...")
             email_resp = auth.github.get('user/emails', token=token)
             emails = email_resp.json()
             # Get primary email
@@ -92,27 +125,25 @@ def github_callback():
                     break
             if not email and emails:
                 email = emails[0].get('email')
-            print(f"[AUTH] Email fetched: {email}")
+            log.debug("[AUTH] Email fetched: %s", email)
 
         # Create user_id from GitHub ID
         user_id = f"github:{user_info['id']}"
         name = user_info.get('name') or user_info.get('login')
-        print(f"[AUTH] Creating user_id: {user_id}, name: {name}")
+        log.debug("[AUTH] Creating user_id: %s, name: %s", user_id, name)
 
         # Get or create user
         user = auth.get_or_create_user(user_id, email, name, 'github')
 
         # Log user in
         login_user(user)
-        print(f"[AUTH] User logged in successfully: {user_id}")
+        log.info(f"[AUTH] User logged in successfully: {user_id}")
 
         # Redirect to main page
         return redirect('/')
 
     except Exception as e:
-        print(f"[AUTH] GitHub OAuth error: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"[AUTH] GitHub OAuth error: {e}")
         return jsonify({'error': 'Authentication failed'}), 500
 
 
@@ -128,42 +159,40 @@ def microsoft_login():
 @app.route('/auth/microsoft/callback')
 def microsoft_callback():
     """Handle Microsoft OAuth callback"""
-    print("[AUTH] Microsoft callback received")
+    log.debug("[AUTH] Microsoft callback received")
     if not auth.microsoft:
-        print("[AUTH] Microsoft OAuth not configured")
+        log.warning("[AUTH] Microsoft OAuth not configured")
         return jsonify({'error': 'Microsoft OAuth not configured'}), 500
 
     try:
-        print("[AUTH] Authorizing Microsoft access token...")
+        log.debug("[AUTH] Authorizing Microsoft access token...")
         token = auth.microsoft.authorize_access_token()
         user_info = token.get('userinfo')
 
         if not user_info:
-            print("[AUTH] Failed to get user info from token")
+            log.error("[AUTH] Failed to get user info from token")
             return jsonify({'error': 'Failed to get user info'}), 500
 
-        print(f"[AUTH] Microsoft user info received: oid={user_info.get('oid')}")
+        log.debug("[AUTH] Microsoft user info received: oid=%s", user_info.get('oid'))
 
         # Create user_id from Microsoft OID
         user_id = f"microsoft:{user_info['oid']}"
         email = user_info.get('email') or user_info.get('preferred_username')
         name = user_info.get('name')
-        print(f"[AUTH] Creating user_id: {user_id}, name: {name}, email: {email}")
+        log.debug("[AUTH] Creating user_id: %s, name: %s, email: %s", user_id, name, email)
 
         # Get or create user
         user = auth.get_or_create_user(user_id, email, name, 'microsoft')
 
         # Log user in
         login_user(user)
-        print(f"[AUTH] User logged in successfully: {user_id}")
+        log.info(f"[AUTH] User logged in successfully: {user_id}")
 
         # Redirect to main page
         return redirect('/')
 
     except Exception as e:
-        print(f"[AUTH] Microsoft OAuth error: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"[AUTH] Microsoft OAuth error: {e}")
         return jsonify({'error': 'Authentication failed'}), 500
 
 
@@ -171,6 +200,10 @@ def microsoft_callback():
 def logout():
     """Log out the current user"""
     from flask import session
+    if current_user.is_authenticated:
+        # Next login reloads the user row instead of serving the cached copy
+        auth.invalidate_user(current_user.id)
+        _me_cache.pop(current_user.id)
     logout_user()
     session.clear()
     return redirect('/login')
@@ -181,22 +214,24 @@ def logout():
 def get_current_user_info():
     """Get current user information including API key"""
     user_id = auth.get_current_user()
-    conn = db.get_connection()
-    try:
-        user_data = db.get_user_by_id(conn, user_id)
-        if user_data:
-            return jsonify({
-                'user_id': user_data['user_id'],
-                'email': user_data['email'],
-                'name': user_data['name'],
-                'provider': user_data['provider'],
-                'api_key': user_data['api_key'],
-                'created_at': user_data['created_at'].isoformat() if user_data['created_at'] else None,
-                'last_login': user_data['last_login'].isoformat() if user_data['last_login'] else None
-            })
-        return jsonify({'error': 'User not found'}), 404
-    finally:
-        conn.close()
+    user_info = _me_cache.get(user_id)
+    if user_info is not None:
+        return jsonify(user_info)
+
+    user_data = auth.get_user_data(user_id)
+    if user_data:
+        user_info = {
+            'user_id': user_data['user_id'],
+            'email': user_data['email'],
+            'name': user_data['name'],
+            'provider': user_data['provider'],
+            'api_key': user_data['api_key'],
+            'created_at': user_data['created_at'].isoformat() if user_data['created_at'] else None,
+            'last_login': user_data['last_login'].isoformat() if user_data['last_login'] else None
+        }
+        _me_cache.set(user_id, user_info)
+        return jsonify(user_info)
+    return jsonify({'error': 'User not found'}), 404
 
 
 # Serve the frontend
@@ -219,12 +254,12 @@ def static_files(path):
 def get_sites():
     """Get all sites with their status"""
     user_id = auth.get_current_user()
-    conn = db.get_connection()
-    try:
-        sites = db.get_all_sites(conn, user_id)
-        return jsonify(sites)
-    finally:
-        conn.close()
+    sites = _sites_cache.get(user_id)
+    if sites is None:
+        with db.connection() as conn:
+            sites = db.get_all_sites(conn, user_id)
+        _sites_cache.set(user_id, sites)
+    return ojsonify(sites)
 
 @app.route('/api/sites', methods=['POST'])
 @auth.require_auth
@@ -242,20 +277,20 @@ def add_site():
         # Normalize site URL
         site_url = db.normalize_site_url(site_url)
 
-        conn = db.get_connection()
-        try:
+        with db.connection() as conn:
             db.add_site(conn, site_url, user_id, interval_hours)
-            # Process site immediately in background
-            if event_loop:
-                try:
-                    asyncio.run_coroutine_threadsafe(process_site_async(site_url, user_id), event_loop)
-                except Exception as e:
-                    print(f"[API] Warning: Could not start async processing for {site_url}: {e}")
-            return jsonify({'success': True, 'site_url': site_url})
-        finally:
-            conn.close()
+        _invalidate_site_caches(user_id)
+        # The interval may have changed - let the scheduler recompute its next wakeup
+        notify_scheduler()
+        # Process site immediately in background
+        if event_loop:
+            try:
+                asyncio.run_coroutine_threadsafe(process_site_async(site_url, user_id), event_loop)
+            except Exception as e:
+                log.warning(f"[API] Could not start async processing for {site_url}: {e}")
+        return jsonify({'success': True, 'site_url': site_url})
     except Exception as e:
-        print(f"[API] Error in add_site: {e}")
+        log.error(f"[API] Error in add_site: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/sites/<path:site_url>', methods=['GET'])
@@ -267,8 +302,7 @@ def get_site_details(site_url):
     # Normalize site URL
     site_url = db.normalize_site_url(site_url)
 
-    conn = db.get_connection()
-    try:
+    with db.connection() as conn:
         cursor = conn.cursor(as_dict=True)
 
         # Get all files for this site with their item counts
@@ -287,30 +321,28 @@ def get_site_details(site_url):
 
         files = cursor.fetchall()
 
-        # Get total vector DB count for this site
-        try:
-            from azure.search.documents import SearchClient
-            from azure.core.credentials import AzureKeyCredential
+    # Get total vector DB count for this site
+    try:
+        from azure.search.documents import SearchClient
+        from azure.core.credentials import AzureKeyCredential
 
-            search_client = SearchClient(
-                endpoint=os.getenv('AZURE_SEARCH_ENDPOINT'),
-                index_name=os.getenv('AZURE_SEARCH_INDEX_NAME', 'crawler-vectors'),
-                credential=AzureKeyCredential(os.getenv('AZURE_SEARCH_KEY'))
-            )
+        search_client = SearchClient(
+            endpoint=os.getenv('AZURE_SEARCH_ENDPOINT'),
+            index_name=os.getenv('AZURE_SEARCH_INDEX_NAME', 'crawler-vectors'),
+            credential=AzureKeyCredential(os.getenv('AZURE_SEARCH_KEY'))
+        )
 
-            results = search_client.search('*', filter=f"site eq '{site_url}'", top=0, include_total_count=True)
-            vector_db_count = results.get_count()
-        except Exception as e:
-            print(f"[API] Error getting vector DB count: {e}")
-            vector_db_count = 0
+        results = search_client.search('*', filter=f"site eq '{site_url}'", top=0, include_total_count=True)
+        vector_db_count = results.get_count()
+    except Exception as e:
+        log.error(f"[API] Error getting vector DB count: {e}")
+        vector_db_count = 0
 
-        return jsonify({
-            'site_url': site_url,
-            'files': files,
-            'vector_db_count': vector_db_count
-        })
-    finally:
-        conn.close()
+    return jsonify({
+        'site_url': site_url,
+        'files': files,
+        'vector_db_count': vector_db_count
+    })
 
 @app.route('/api/sites/<path:site_url>', methods=['DELETE'])
 @auth.require_auth
@@ -321,34 +353,37 @@ def delete_site(site_url):
     # Normalize site URL
     site_url = db.normalize_site_url(site_url)
 
-    conn = db.get_connection()
-    try:
+    with db.connection() as conn:
         cursor = conn.cursor()
 
-        # Get all unique schema_maps for this site and user
+        # Get all files of this site in one query, grouped by schema_map
         cursor.execute("""
-            SELECT DISTINCT schema_map FROM files
+            SELECT file_url, schema_map FROM files
             WHERE site_url = %s AND user_id = %s
         """, (site_url, user_id))
-        schema_maps = [row[0] for row in cursor.fetchall()]
-
-        # Delete each schema_map (queues removal jobs and deletes from DB)
-        total_files_removed = 0
-        for schema_map_url in schema_maps:
-            files_removed = _delete_schema_map_internal(conn, site_url, user_id, schema_map_url)
-            total_files_removed += files_removed
+        files_by_schema_map = {}
+        for file_url, schema_map_url in cursor.fetchall():
+            files_by_schema_map.setdefault(schema_map_url, []).append(file_url)
+        file_urls = [file_url for files in files_by_schema_map.values() for file_url in files]
+
+        # Queue removal jobs for every file (workers delete ids, vectors and file rows)
+        from queue_interface_aad import get_queue_with_aad
+        queue = get_queue_with_aad()
+        try:
+            _queue_removed_files(queue, site_url, user_id, file_urls)
+        finally:
+            queue.close()
 
         # Finally delete the site itself
         cursor.execute("DELETE FROM sites WHERE site_url = %s AND user_id = %s", (site_url, user_id))
         conn.commit()
+    _invalidate_site_caches(user_id)
 
-        return jsonify({
-            'success': True,
-            'schema_maps_removed': len(schema_maps),
-            'files_queued_for_removal': total_files_removed
-        })
-    finally:
-        conn.close()
+    return jsonify({
+        'success': True,
+        'schema_maps_removed': len(files_by_schema_map),
+        'files_queued_for_removal': len(file_urls)
+    })
 
 def _delete_schema_map_internal(conn, site_url, user_id, schema_map_url):
     """Internal function to delete files for a schema_map and queue removal jobs"""
@@ -361,26 +396,42 @@ def _delete_schema_map_internal(conn, site_url, user_id, schema_map_url):
         SELECT file_url FROM files
         WHERE site_url = %s AND user_id = %s AND schema_map = %s
     """, (site_url, user_id, schema_map_url))
-    files = [row[0] for row in cursor.fetchall()]
 
     # Queue removal jobs for each file so workers can:
     # 1. Remove IDs from ids table
     # 2. Remove from vector DB
     # 3. Delete from files table
+    # Rows are streamed in chunks and each chunk is sent as queue batches
     queue = get_queue_with_aad()
-    for file_url in files:
-        job = {
+    files_count = 0
+    try:
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            _queue_removed_files(queue, site_url, user_id, [row[0] for row in rows])
+            files_count += len(rows)
+    finally:
+        queue.close()
+
+    # NOTE: Do NOT delete from files or ids tables here - workers will do that when they process the jobs
+    # This ensures proper ordering: ids deleted first, then vector DB cleaned, then files table cleaned
+
+    return files_count
+
+def _queue_removed_files(queue, site_url, user_id, file_urls, batch_size=100):
+    """Queue process_removed_file jobs for the given files in batches"""
+    jobs = [
+        {
             'type': 'process_removed_file',
             'user_id': user_id,  # Add user_id to job
             'site': site_url,
             'file_url': file_url
         }
-        queue.send_message(job)
-
-    # NOTE: Do NOT delete from files or ids tables here - workers will do that when they process the jobs
-    # This ensures proper ordering: ids deleted first, then vector DB cleaned, then files table cleaned
-
-    return len(files)
+        for file_url in file_urls
+    ]
+    for i in range(0, len(jobs), batch_size):
+        queue.send_message_batch(jobs[i:i + batch_size])
 
 @app.route('/api/sites/<path:site_url>/schema-files', methods=['POST'])
 @auth.require_auth
@@ -401,6 +452,7 @@ def add_schema_file(site_url):
     try:
         # Use the Level 2 logic from master.py
         files_added, files_queued = add_schema_map_to_site(site_url, user_id, schema_map_url)
+        _invalidate_site_caches(user_id)
 
         if files_added == 0:
             return jsonify({'error': 'No schema files found or failed to fetch schema_map'}), 400
@@ -431,19 +483,17 @@ def delete_schema_file(site_url):
     if not schema_map_url:
         return jsonify({'error': 'schema_map_url is required'}), 400
 
-    conn = db.get_connection()
-    try:
+    with db.connection() as conn:
         # Use the internal function to delete files and queue removal jobs
         files_removed = _delete_schema_map_internal(conn, site_url, user_id, schema_map_url)
         conn.commit()
+    _invalidate_site_caches(user_id)
 
-        return jsonify({
-            'success': True,
-            'deleted_count': files_removed,
-            'files_queued_for_removal': files_removed
-        })
-    finally:
-        conn.close()
+    return jsonify({
+        'success': True,
+        'deleted_count': files_removed,
+        'files_queued_for_removal': files_removed
+    })
 
 @app.route('/api/sites/<path:site_url>/vector-count', methods=['GET'])
 @auth.require_auth
@@ -456,14 +506,11 @@ def get_site_vector_count(site_url):
     site_url = db.normalize_site_url(site_url)
 
     # Verify user owns this site
-    conn = db.get_connection()
-    try:
+    with db.connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT site_url FROM sites WHERE site_url = %s AND user_id = %s", (site_url, user_id))
         if not cursor.fetchone():
             return jsonify({'error': 'Site not found'}), 404
-    finally:
-        conn.close()
 
     # Get count from vector DB
     from vector_db import vector_db_count_by_site
@@ -477,22 +524,95 @@ def get_site_vector_count(site_url):
 def get_status():
     """Get overall system status"""
     user_id = auth.get_current_user()
-    conn = db.get_connection()
+    sites_status = _status_cache.get(user_id)
+    if sites_status is None:
+        with db.connection() as conn:
+            sites_status = db.get_site_status(conn, user_id)
+        _status_cache.set(user_id, sites_status)
+    # Return object with master info and sites array
+    return ojsonify({
+        'master_started_at': master_started_at.isoformat(),
+        'master_uptime_seconds': (datetime.utcnow() - master_started_at).total_seconds(),
+        'sites': sites_status
+    })
+
+# Queue clients used by /api/queue/status - building them costs hundreds of ms,
+# so they are created once and reused (on the process-wide credential)
+_status_clients = {}
+_status_clients_lock = threading.Lock()
+
+def _create_status_client(queue_type):
+    """Create the Service Bus client or Storage queue client for queue status (None if not configured)"""
+    if queue_type == 'servicebus':
+        from azure.servicebus import ServiceBusClient
+
+        conn_str = os.getenv('AZURE_SERVICEBUS_CONNECTION_STRING')
+        namespace = os.getenv('AZURE_SERVICEBUS_NAMESPACE')
+
+        # Support both connection string and Azure AD authentication
+        if conn_str:
+            return ServiceBusClient.from_connection_string(conn_str)
+        if namespace:
+            # Use Azure AD authentication (Managed Identity or DefaultAzureCredential)
+            fully_qualified_namespace = namespace if '.servicebus.windows.net' in namespace else f"{namespace}.servicebus.windows.net"
+            return ServiceBusClient(fully_qualified_namespace, get_azure_credential())
+        return None
+
+    if queue_type == 'storage':
+        from azure.storage.queue import QueueServiceClient
+
+        storage_account = os.getenv('AZURE_STORAGE_ACCOUNT_NAME')
+        queue_name = os.getenv('AZURE_STORAGE_QUEUE_NAME', 'crawler-jobs')
+        if not storage_account:
+            return None
+
+        # Use Azure AD authentication
+        account_url = f"https://{storage_account}.queue.core.windows.net"
+        service_client = QueueServiceClient(account_url=account_url, credential=get_azure_credential())
+        return service_client.get_queue_client(queue_name)
+
+    return None
+
+def _get_status_client(queue_type):
+    """Get the cached queue status client, creating it on first use"""
+    with _status_clients_lock:
+        client = _status_clients.get(queue_type)
+        if client is None:
+            client = _create_status_client(queue_type)
+            if client is not None:
+                _status_clients[queue_type] = client
+        return client
+
+def _reset_status_client(queue_type):
+    """Drop a cached client so the next call rebuilds it (e.g. after an auth failure)"""
+    with _status_clients_lock:
+        client = _status_clients.pop(queue_type, None)
+    if client is not None:
+        try:
+            client.close()
+        except Exception:
+            pass
+
+def _is_auth_error(error):
+    """Whether an Azure SDK error means the credential/token needs rebuilding"""
+    from azure.core.exceptions import ClientAuthenticationError
+    if isinstance(error, ClientAuthenticationError):
+        return True
     try:
-        sites_status = db.get_site_status(conn, user_id)
-        # Return object with master info and sites array
-        return jsonify({
-            'master_started_at': master_started_at.isoformat(),
-            'master_uptime_seconds': (datetime.utcnow() - master_started_at).total_seconds(),
-            'sites': sites_status
-        })
-    finally:
-        conn.close()
+        from azure.servicebus.exceptions import ServiceBusAuthenticationError, ServiceBusAuthorizationError
+        return isinstance(error, (ServiceBusAuthenticationError, ServiceBusAuthorizationError))
+    except ImportError:
+        return False
 
 @app.route('/api/queue/status', methods=['GET'])
 def get_queue_status():
-    """Get queue processing status"""
+    """
+    Get queue processing status. The preview of recent jobs is only included
+    with ?include_jobs=true, since for the file queue it means listing the
+    whole queue directory; the counts alone never scan it.
+    """
     queue_type = os.getenv('QUEUE_TYPE', 'file')
+    include_jobs = request.args.get('include_jobs', 'false').lower() == 'true'
 
     status = {
         'queue_type': queue_type,
@@ -503,6 +623,11 @@ def get_queue_status():
         'error': None
     }
 
+    if queue_type != 'file':
+        cached_status = _queue_status_cache.get(queue_type)
+        if cached_status is not None:
+            return jsonify(cached_status if include_jobs else {**cached_status, 'jobs': []})
+
     try:
         if queue_type == 'file':
             # File-based queue status
@@ -510,84 +635,82 @@ def get_queue_status():
             status['queue_dir'] = queue_dir
 
             if os.path.exists(queue_dir):
-                # Count pending jobs
-                for filename in sorted(os.listdir(queue_dir), reverse=True):
-                    if filename.startswith('job-') and filename.endswith('.json'):
-                        status['pending_jobs'] += 1
-                        # Read job details (limit to 20 most recent)
-                        if len([j for j in status['jobs'] if j['status'] == 'pending']) < 20:
-                            try:
-                                with open(os.path.join(queue_dir, filename)) as f:
-                                    job = json.load(f)
-                                    status['jobs'].append({
-                                        'id': filename,
-                                        'status': 'pending',
-                                        'type': job.get('type'),
-                                        'site': job.get('site'),
-                                        'file_url': job.get('file_url'),
-                                        'queued_at': job.get('queued_at')
-                                    })
-                            except:
-                                pass
-                    elif filename.endswith('.processing'):
-                        status['processing_jobs'] += 1
-                        # Read job details
-                        try:
-                            filepath = os.path.join(queue_dir, filename)
-                            mtime = os.path.getmtime(filepath)
-                            age_seconds = int(time.time() - mtime)
-
-                            with open(filepath) as f:
-                                job = json.load(f)
-                                status['jobs'].append({
-                                    'id': filename,
-                                    'status': 'processing',
-                                    'type': job.get('type'),
-                                    'site': job.get('site'),
-                                    'file_url': job.get('file_url'),
-                                    'queued_at': job.get('queued_at'),
-                                    'processing_time': age_seconds
-                                })
-                        except:
-                            pass
+                # Depths come from the queue's persistent counters; the directory is
+                # only listed (names, no stat) when the preview of the 20 newest jobs
+                # is asked for
+                counts = FileQueue(queue_dir).get_counts()
+                status['pending_jobs'] = counts['pending']
+                status['processing_jobs'] = counts['processing']
+
+                pending_entries = []
+                processing_entries = []
+                if include_jobs:
+                    with os.scandir(queue_dir) as entries:
+                        for entry in entries:
+                            if entry.name.startswith('job-') and entry.name.endswith('.json'):
+                                pending_entries.append(entry)
+                            elif entry.name.endswith('.processing'):
+                                processing_entries.append(entry)
+
+                for entry in heapq.nlargest(20, pending_entries, key=lambda e: e.name):
+                    try:
+                        with open(entry.path, 'rb') as f:
+                            job = orjson.loads(f.read())
+                        status['jobs'].append({
+                            'id': entry.name,
+                            'status': 'pending',
+                            'type': job.get('type'),
+                            'site': job.get('site'),
+                            'file_url': job.get('file_url'),
+                            'queued_at': job.get('queued_at')
+                        })
+                    except:
+                        pass
+
+                now = time.time()
+                for entry in heapq.nlargest(20, processing_entries, key=lambda e: e.name):
+                    try:
+                        age_seconds = int(now - entry.stat().st_mtime)
+                        with open(entry.path, 'rb') as f:
+                            job = orjson.loads(f.read())
+                        status['jobs'].append({
+                            'id': entry.name,
+                            'status': 'processing',
+                            'type': job.get('type'),
+                            'site': job.get('site'),
+                            'file_url': job.get('file_url'),
+                            'queued_at': job.get('queued_at'),
+                            'processing_time': age_seconds
+                        })
+                    except:
+                        pass
 
                 # Count failed jobs
                 error_dir = os.path.join(queue_dir, 'errors')
                 if os.path.exists(error_dir):
-                    for filename in os.listdir(error_dir):
-                        if filename.startswith('job-') or filename.startswith('failed-'):
-                            status['failed_jobs'] += 1
+                    with os.scandir(error_dir) as entries:
+                        status['failed_jobs'] = sum(
+                            1 for entry in entries
+                            if entry.name.startswith('job-') or entry.name.startswith('failed-')
+                        )
 
         elif queue_type == 'servicebus':
             # Azure Service Bus status
-            try:
-                from azure.servicebus import ServiceBusClient
-                from azure.identity import DefaultAzureCredential
-
-                conn_str = os.getenv('AZURE_SERVICEBUS_CONNECTION_STRING')
-                namespace = os.getenv('AZURE_SERVICEBUS_NAMESPACE')
-                queue_name = os.getenv('AZURE_SERVICE_BUS_QUEUE_NAME', 'crawler-queue')
-
-                # Support both connection string and Azure AD authentication
-                if conn_str:
-                    client = ServiceBusClient.from_connection_string(conn_str)
-                elif namespace:
-                    # Use Azure AD authentication (Managed Identity or DefaultAzureCredential)
-                    credential = DefaultAzureCredential()
-                    fully_qualified_namespace = namespace if '.servicebus.windows.net' in namespace else f"{namespace}.servicebus.windows.net"
-                    client = ServiceBusClient(fully_qualified_namespace, credential)
-                else:
+            queue_name = os.getenv('AZURE_SERVICE_BUS_QUEUE_NAME', 'crawler-queue')
+            for attempt in range(2):
+                client = _get_status_client('servicebus')
+                if client is None:
                     status['error'] = 'Azure Service Bus not configured (need connection string or namespace)'
                     return jsonify(status)
-
-                with client.get_queue_receiver(queue_name, max_wait_time=1) as receiver:
-                    # Peek at messages without consuming
-                    messages = receiver.peek_messages(max_message_count=50)
+                try:
+                    with client.get_queue_receiver(queue_name, max_wait_time=1) as receiver:
+                        # Peek at messages without consuming
+                        messages = receiver.peek_messages(max_message_count=50)
                     status['pending_jobs'] = len(messages)
 
                     for msg in messages[:20]:  # Limit to 20 for display
                         try:
-                            content = json.loads(str(msg))
+                            content = orjson.loads(str(msg))
                             status['jobs'].append({
                                 'id': str(msg.message_id),
                                 'status': 'pending',
@@ -599,49 +722,49 @@ def get_queue_status():
                             })
                         except:
                             pass
-            except Exception as e:
-                status['error'] = f'Error connecting to Service Bus: {str(e)}'
+                    break
+                except Exception as e:
+                    if _is_auth_error(e) and attempt == 0:
+                        # Credential/token went stale - rebuild the client once
+                        _reset_status_client('servicebus')
+                        continue
+                    status['error'] = f'Error connecting to Service Bus: {str(e)}'
+                    break
 
         elif queue_type == 'storage':
             # Azure Storage Queue status
-            try:
-                from azure.storage.queue import QueueServiceClient
-                from azure.identity import DefaultAzureCredential
-
-                storage_account = os.getenv('AZURE_STORAGE_ACCOUNT_NAME')
-                queue_name = os.getenv('AZURE_STORAGE_QUEUE_NAME', 'crawler-jobs')
-
-                if not storage_account:
+            for attempt in range(2):
+                queue_client = _get_status_client('storage')
+                if queue_client is None:
                     status['error'] = 'Azure Storage Queue not configured (AZURE_STORAGE_ACCOUNT_NAME not set)'
                     return jsonify(status)
+                try:
+                    properties = queue_client.get_queue_properties()
+                    status['pending_jobs'] = properties.get('approximate_message_count', 0)
 
-                # Use Azure AD authentication
-                account_url = f"https://{storage_account}.queue.core.windows.net"
-                credential = DefaultAzureCredential()
-                service_client = QueueServiceClient(account_url=account_url, credential=credential)
-                queue_client = service_client.get_queue_client(queue_name)
-
-                properties = queue_client.get_queue_properties()
-                status['pending_jobs'] = properties.get('approximate_message_count', 0)
-
-                # Peek at messages
-                messages = queue_client.peek_messages(max_messages=20)
-                for msg in messages:
-                    try:
-                        content = json.loads(msg.content)
-                        status['jobs'].append({
-                            'id': msg.id,
-                            'status': 'pending',
-                            'type': content.get('type'),
-                            'site': content.get('site'),
-                            'file_url': content.get('file_url'),
-                            'queued_at': content.get('queued_at'),
-                            'inserted_on': str(msg.inserted_on) if msg.inserted_on else None
-                        })
-                    except:
-                        pass
-            except Exception as e:
-                status['error'] = f'Error connecting to Storage Queue: {str(e)}'
+                    # Peek at messages
+                    messages = queue_client.peek_messages(max_messages=20)
+                    for msg in messages:
+                        try:
+                            content = orjson.loads(msg.content)
+                            status['jobs'].append({
+                                'id': msg.id,
+                                'status': 'pending',
+                                'type': content.get('type'),
+                                'site': content.get('site'),
+                                'file_url': content.get('file_url'),
+                                'queued_at': content.get('queued_at'),
+                                'inserted_on': str(msg.inserted_on) if msg.inserted_on else None
+                            })
+                        except:
+                            pass
+                    break
+                except Exception as e:
+                    if _is_auth_error(e) and attempt == 0:
+                        _reset_status_client('storage')
+                        continue
+                    status['error'] = f'Error connecting to Storage Queue: {str(e)}'
+                    break
 
     except Exception as e:
         status['error'] = f'Error getting queue status: {str(e)}'
@@ -651,7 +774,10 @@ def get_queue_status():
     # Sort jobs by status (processing first, then pending)
     status['jobs'].sort(key=lambda x: (x['status'] != 'processing', x.get('queued_at') or ''), reverse=True)
 
-    return jsonify(status)
+    if queue_type != 'file' and not status['error']:
+        _queue_status_cache.set(queue_type, status)
+
+    return jsonify(status if include_jobs else {**status, 'jobs': []})
 
 @app.route('/api/process/<path:site_url>', methods=['POST'])
 @auth.require_auth
@@ -668,12 +794,12 @@ def trigger_process(site_url):
             try:
                 asyncio.run_coroutine_threadsafe(process_site_async(site_url, user_id), event_loop)
             except Exception as e:
-                print(f"[API] Warning: Could not trigger processing for {site_url}: {e}")
+                log.warning(f"[API] Could not trigger processing for {site_url}: {e}")
         else:
-            print("[API] Warning: Event loop not initialized")
+            log.warning("[API] Event loop not initialized")
         return jsonify({'success': True, 'message': f'Processing started for {site_url}'})
     except Exception as e:
-        print(f"[API] Error in trigger_process: {e}")
+        log.error(f"[API] Error in trigger_process: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/scheduler/status', methods=['GET'])
@@ -685,7 +811,7 @@ def get_scheduler_status():
 
     return jsonify({
         'running': is_running,
-        'check_interval_seconds': 60
+        'check_interval_seconds': SCHEDULER_MAX_SLEEP_SECONDS
     })
 
 @app.route('/api/scheduler/start', methods=['POST'])
@@ -709,99 +835,118 @@ def get_site_files(site_url):
     # Normalize site URL
     site_url = db.normalize_site_url(site_url)
 
-    conn = db.get_connection()
-    try:
-        cursor = conn.cursor()
+    # Rows come back as dicts shaped like the response; BIT columns arrive as bools
+    with db.connection() as conn:
+        cursor = conn.cursor(as_dict=True)
         cursor.execute("""
-            SELECT file_url, schema_map, last_read_time, number_of_items, is_manual, is_active
+            SELECT file_url, schema_map, last_read_time, number_of_items,
+                   ISNULL(is_manual, 0) AS is_manual, ISNULL(is_active, 0) AS is_active
             FROM files
             WHERE site_url = %s AND user_id = %s AND is_active = 1
             ORDER BY file_url
         """, (site_url, user_id))
-
-        files = [
-            {
-                'file_url': row[0],
-                'schema_map': row[1],
-                'last_read_time': row[2].isoformat() if row[2] else None,
-                'number_of_items': row[3],
-                'is_manual': bool(row[4]),
-                'is_active': bool(row[5])
-            }
-            for row in cursor.fetchall()
-        ]
-        return jsonify(files)
-    finally:
-        conn.close()
+        files = cursor.fetchall()
+    return ojsonify(files)
+
+SQL_GET_ALL_FILES = db.PreparedStatement("""
+    SELECT f.site_url, f.file_url, f.schema_map,
+           ISNULL(f.is_active, 0) AS is_active, ISNULL(f.is_manual, 0) AS is_manual,
+           f.number_of_items, f.last_read_time,
+           COUNT(DISTINCT i.id) as id_count
+    FROM files f
+    LEFT JOIN ids i ON f.file_url = i.file_url AND f.user_id = i.user_id
+    WHERE f.user_id = @user_id
+    GROUP BY f.site_url, f.file_url, f.schema_map, f.is_active, f.is_manual,
+             f.number_of_items, f.last_read_time
+    ORDER BY f.site_url, f.file_url
+""", user_id='VARCHAR(255)')
 
 @app.route('/api/files', methods=['GET'])
 @auth.require_auth
 def get_all_files():
     """Get all files from the database with their IDs"""
     user_id = auth.get_current_user()
-    conn = db.get_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT f.site_url, f.file_url, f.schema_map, f.is_active, f.is_manual,
-                   f.number_of_items, f.last_read_time,
-                   COUNT(DISTINCT i.id) as id_count
-            FROM files f
-            LEFT JOIN ids i ON f.file_url = i.file_url AND f.user_id = i.user_id
-            WHERE f.user_id = %s
-            GROUP BY f.site_url, f.file_url, f.schema_map, f.is_active, f.is_manual,
-                     f.number_of_items, f.last_read_time
-            ORDER BY f.site_url, f.file_url
-        """, (user_id,))
-
-        files = [
-            {
-                'site_url': row[0],
-                'file_url': row[1],
-                'schema_map': row[2],
-                'is_active': bool(row[3]),
-                'is_manual': bool(row[4]),
-                'number_of_items': row[5],
-                'last_read_time': row[6].isoformat() if row[6] else None,
-                'id_count': row[7]
-            }
-            for row in cursor.fetchall()
-        ]
-        return jsonify(files)
-    finally:
-        conn.close()
+    # Rows come back as dicts shaped like the response; BIT columns arrive as bools
+    with db.connection() as conn:
+        cursor = conn.cursor(as_dict=True)
+        SQL_GET_ALL_FILES.execute(cursor, user_id)
+        files = cursor.fetchall()
+    return ojsonify(files)
+
+SQL_GET_FILE_IDS = db.PreparedStatement("""
+    SELECT id
+    FROM ids
+    WHERE file_url = @file_url AND user_id = @user_id
+    ORDER BY id
+    OFFSET @offset ROWS FETCH NEXT @limit ROWS ONLY
+""", file_url='VARCHAR(500)', user_id='VARCHAR(255)', offset='INT', limit='INT')
+
+SQL_COUNT_FILE_IDS = db.PreparedStatement("""
+    SELECT COUNT(*)
+    FROM ids
+    WHERE file_url = @file_url AND user_id = @user_id
+""", file_url='VARCHAR(500)', user_id='VARCHAR(255)')
 
 @app.route('/api/files/<path:file_url>/ids', methods=['GET'])
 @auth.require_auth
 def get_file_ids(file_url):
-    """Get all IDs for a specific file"""
+    """
+    Get IDs for a specific file, one page at a time (?limit=10000&offset=0).
+    `count` is the file's full ID count, `page_count` the number of IDs in this
+    page and `has_more` says whether another page follows.
+
+    The queries and the first rows are read before the response starts, so a
+    failing query still returns a 500; the rest of the page is streamed so
+    memory stays flat for large pages.
+    """
     user_id = auth.get_current_user()
-    conn = db.get_connection()
     try:
+        limit = int(request.args.get('limit', 10000))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+    if limit < 1 or offset < 0:
+        return jsonify({'error': 'limit must be positive and offset non-negative'}), 400
+
+    # The connection is held until the body is sent, so borrow it from the pool
+    # directly rather than through db.connection()'s per-context reuse
+    stack = ExitStack()
+    try:
+        conn = stack.enter_context(db.get_pool().connection())
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id
-            FROM ids
-            WHERE file_url = %s AND user_id = %s
-            ORDER BY id
-        """, (file_url, user_id))
-
-        ids = [row[0] for row in cursor.fetchall()]
-        return jsonify({
-            'file_url': file_url,
-            'ids': ids,
-            'count': len(ids)
-        })
-    finally:
-        conn.close()
+        SQL_COUNT_FILE_IDS.execute(cursor, file_url, user_id)
+        total = cursor.fetchone()[0]
+        SQL_GET_FILE_IDS.execute(cursor, file_url, user_id, offset, limit)
+        rows = cursor.fetchmany(1000)
+    except BaseException:
+        stack.__exit__(*sys.exc_info())
+        raise
+
+    def generate():
+        nonlocal rows
+        with stack:
+            yield b'{"file_url": %s, "limit": %d, "offset": %d, "count": %d, "ids": [' % (
+                orjson.dumps(file_url), limit, offset, total)
+            page_count = 0
+            while rows:
+                chunk = orjson.dumps([row[0] for row in rows])[1:-1]
+                yield (b',' if page_count else b'') + chunk
+                page_count += len(rows)
+                rows = cursor.fetchmany(1000)
+        has_more = offset + page_count < total
+        yield b'], "page_count": %d, "has_more": %s}' % (page_count, b'true' if has_more else b'false')
+
+    response = Response(stream_with_context(generate()), mimetype='application/json')
+    # Returns the connection even if the client goes away before the body starts
+    response.call_on_close(stack.close)
+    return response
 
 @app.route('/api/files/<path:file_url>/details', methods=['GET'])
 @auth.require_auth
 def get_file_details(file_url):
     """Get detailed information about a file including errors"""
     user_id = auth.get_current_user()
-    conn = db.get_connection()
-    try:
+    with db.connection() as conn:
         cursor = conn.cursor(as_dict=True)
 
         # Get file info
@@ -826,100 +971,157 @@ def get_file_details(file_url):
         """, (file_url, user_id))
         id_count = cursor.fetchone()['id_count']
 
-        return jsonify({
-            'file_url': file_url,
-            'site_url': file_info['site_url'],
-            'schema_map': file_info['schema_map'],
-            'last_read_time': file_info['last_read_time'].isoformat() if file_info['last_read_time'] else None,
-            'number_of_items': file_info['number_of_items'] or id_count,
-            'id_count': id_count,
-            'is_active': file_info['is_active'],
-            'errors': errors
-        })
-    finally:
-        conn.close()
+    return jsonify({
+        'file_url': file_url,
+        'site_url': file_info['site_url'],
+        'schema_map': file_info['schema_map'],
+        'last_read_time': file_info['last_read_time'].isoformat() if file_info['last_read_time'] else None,
+        'number_of_items': file_info['number_of_items'] or id_count,
+        'id_count': id_count,
+        'is_active': file_info['is_active'],
+        'errors': errors
+    })
+
+def tail_jsonl(path, n=1000, window=1024 * 1024):
+    """
+    Parse the last n lines of a JSONL file without reading the whole file.
+    Reads a trailing window of bytes, doubling it until n lines are found
+    or the start of the file is reached. Unparseable lines are skipped.
+    """
+    with open(path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        while True:
+            start = max(0, size - window)
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(f.fileno(), start, size - start, os.POSIX_FADV_SEQUENTIAL)
+            f.seek(start)
+            lines = f.read().split(b'\n')
+            if start > 0:
+                lines = lines[1:]  # First line is partial
+            lines = [line for line in lines if line.strip()]
+            if len(lines) >= n or start == 0:
+                break
+            window *= 2
+
+    entries = []
+    for line in lines[-n:]:
+        try:
+            entries.append(orjson.loads(line))
+        except ValueError:
+            continue
+    return entries
+
+QUEUE_LOG_FILE = '/app/data/queue_history.jsonl'
+FETCH_LOG_FILE = '/app/data/fetch_log.jsonl'
+
+def read_log_newest_first(path, n=1000):
+    """Last n entries of a JSONL log in reverse chronological order ([] if no log yet)"""
+    if not os.path.exists(path):
+        return []
+    return tail_jsonl(path, n)[::-1]
 
 @app.route('/api/queue/history', methods=['GET'])
 def get_queue_history():
     """Get queue history from log file"""
-    import os
-    QUEUE_LOG_FILE = '/app/data/queue_history.jsonl'
-
     try:
-        if not os.path.exists(QUEUE_LOG_FILE):
-            return jsonify([])
-
-        # Read last 1000 lines
-        history = []
-        with open(QUEUE_LOG_FILE, 'r') as f:
-            lines = f.readlines()
-            for line in lines[-1000:]:
-                try:
-                    history.append(json.loads(line.strip()))
-                except json.JSONDecodeError:
-                    continue
-
-        # Return in reverse chronological order (newest first)
-        return jsonify(list(reversed(history)))
+        return ojsonify(read_log_newest_first(QUEUE_LOG_FILE))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/fetch-log', methods=['GET'])
 def get_fetch_log():
     """Get URL fetch log from workers"""
-    import os
-    FETCH_LOG_FILE = '/app/data/fetch_log.jsonl'
-
     try:
-        if not os.path.exists(FETCH_LOG_FILE):
-            return jsonify([])
-
-        # Read last 1000 lines
-        log_entries = []
-        with open(FETCH_LOG_FILE, 'r') as f:
-            lines = f.readlines()
-            for line in lines[-1000:]:
-                try:
-                    log_entries.append(json.loads(line.strip()))
-                except json.JSONDecodeError:
-                    continue
+        return ojsonify(read_log_newest_first(FETCH_LOG_FILE))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        # Return in reverse chronological order (newest first)
-        return jsonify(list(reversed(log_entries)))
+@app.route('/api/logs', methods=['GET'])
+async def get_logs():
+    """Get queue history and fetch log together, reading both files concurrently"""
+    try:
+        loop = asyncio.get_running_loop()
+        queue_history, fetch_log = await asyncio.gather(
+            loop.run_in_executor(None, read_log_newest_first, QUEUE_LOG_FILE),
+            loop.run_in_executor(None, read_log_newest_first, FETCH_LOG_FILE),
+        )
+        return ojsonify({'queue_history': queue_history, 'fetch_log': fetch_log})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Worker status probes share one bounded pool and keep-alive connections across requests.
+# (connect, read) timeouts: an unreachable pod fails fast instead of holding a probe thread.
+WORKER_PROBE_TIMEOUT = (1, 2)
+K8S_API_TIMEOUT = (3, 10)
+_PROBE_POOL = ThreadPoolExecutor(max_workers=32, thread_name_prefix='worker-probe')
+_probe_session = requests.Session()
+_probe_session.mount('http://', HTTPAdapter(pool_connections=32, pool_maxsize=32))
+
+# Kubernetes API access: one TLS session, token re-read only when the mounted file rotates
+K8S_SERVICEACCOUNT_DIR = '/var/run/secrets/kubernetes.io/serviceaccount'
+_k8s_session = requests.Session()
+_k8s_session.verify = os.path.join(K8S_SERVICEACCOUNT_DIR, 'ca.crt')
+_k8s_token = {'value': None, 'mtime': None}
+_pods_cache = TTLCache(maxsize=1, ttl=3)
+
+def _get_k8s_token():
+    """Get the service account token, re-reading the file only when it changes"""
+    path = os.path.join(K8S_SERVICEACCOUNT_DIR, 'token')
+    mtime = os.path.getmtime(path)
+    if mtime != _k8s_token['mtime']:
+        with open(path, 'r') as f:
+            _k8s_token['value'] = f.read()
+        _k8s_token['mtime'] = mtime
+    return _k8s_token['value']
+
+async def _fetch_worker_status(worker_info):
+    """Fill in a running worker's /status response (or the error fetching it)"""
+    loop = asyncio.get_running_loop()
+    try:
+        response = await loop.run_in_executor(
+            _PROBE_POOL, lambda: _probe_session.get(f"http://{worker_info['ip']}:8080/status", timeout=WORKER_PROBE_TIMEOUT)
+        )
+        if response.status_code == 200:
+            worker_info['status'] = response.json()
+    except Exception as e:
+        worker_info['error'] = str(e)
+
 @app.route('/api/workers', methods=['GET'])
-def get_workers():
+async def get_workers():
     """Get all worker pods and their status"""
     try:
-        import requests as req
-
         # Use Kubernetes API from within the cluster
         # Service account token and CA cert are automatically mounted
         k8s_host = os.getenv('KUBERNETES_SERVICE_HOST', 'kubernetes.default.svc')
         k8s_port = os.getenv('KUBERNETES_SERVICE_PORT', '443')
         namespace = 'crawler'
 
-        # Read service account token
-        with open('/var/run/secrets/kubernetes.io/serviceaccount/token', 'r') as f:
-            token = f.read()
+        # The UI polls much faster than pods change - reuse the pod list briefly
+        pods_data = _pods_cache.get('pods')
+        if pods_data is None:
+            # Read service account token
+            token = _get_k8s_token()
 
-        # API endpoint to list pods with label selector
-        url = f'https://{k8s_host}:{k8s_port}/api/v1/namespaces/{namespace}/pods?labelSelector=app=crawler-worker'
+            # API endpoint to list pods with label selector
+            url = f'https://{k8s_host}:{k8s_port}/api/v1/namespaces/{namespace}/pods?labelSelector=app=crawler-worker'
 
-        headers = {
-            'Authorization': f'Bearer {token}'
-        }
+            headers = {
+                'Authorization': f'Bearer {token}'
+            }
 
-        # Get pods from Kubernetes API
-        response = req.get(url, headers=headers, verify='/var/run/secrets/kubernetes.io/serviceaccount/ca.crt', timeout=10)
+            # Get pods from Kubernetes API
+            response = await asyncio.get_running_loop().run_in_executor(
+                _PROBE_POOL, lambda: _k8s_session.get(url, headers=headers, timeout=K8S_API_TIMEOUT)
+            )
+
+            if response.status_code != 200:
+                return jsonify({'error': 'Failed to get worker pods from Kubernetes API', 'status': response.status_code}), 500
 
-        if response.status_code != 200:
-            return jsonify({'error': 'Failed to get worker pods from Kubernetes API', 'status': response.status_code}), 500
+            pods_data = response.json()
+            _pods_cache.set('pods', pods_data)
 
-        pods_data = response.json()
         workers = []
+        probes = []
 
         for pod in pods_data.get('items', []):
             pod_name = pod['metadata']['name']
@@ -936,110 +1138,188 @@ def get_workers():
 
             # Try to fetch status from worker if it's running
             if phase == 'Running' and pod_ip and pod_ip != 'N/A':
-                try:
-                    response = req.get(f'http://{pod_ip}:8080/status', timeout=2)
-                    if response.status_code == 200:
-                        worker_info['status'] = response.json()
-                except Exception as e:
-                    worker_info['error'] = str(e)
+                probes.append(_fetch_worker_status(worker_info))
 
             workers.append(worker_info)
 
+        # Probe all running workers concurrently - latency is the slowest pod, not the sum
+        await asyncio.gather(*probes)
+
         return jsonify(workers)
     except Exception as e:
         import traceback
         return jsonify({'error': str(e), 'traceback': traceback.format_exc()}), 500
 
+# process_site runs on its own bounded pool (not the loop's default executor);
+# the semaphore makes extra callers wait on the loop instead of piling up in the pool queue
+PROCESS_SITE_WORKERS = int(os.getenv('PROCESS_SITE_WORKERS', '8'))
+_PROCESS_EXECUTOR = ThreadPoolExecutor(max_workers=PROCESS_SITE_WORKERS, thread_name_prefix='process-site')
+_process_semaphore = asyncio.Semaphore(PROCESS_SITE_WORKERS)
+
+# (site_url, user_id) -> task for runs in flight; repeat triggers await the same run.
+# Only touched from the event loop thread, with no await between lookup and insert.
+_inflight_process = {}
+
+async def _run_process_site(site_url, user_id):
+    """Run process_site on the dedicated executor once a slot is free"""
+    try:
+        async with _process_semaphore:
+            # Run process_site in a thread pool to avoid blocking the event loop
+            await asyncio.get_running_loop().run_in_executor(_PROCESS_EXECUTOR, process_site, site_url, user_id)
+    finally:
+        _inflight_process.pop((site_url, user_id), None)
+
 async def process_site_async(site_url, user_id):
     """Async wrapper for process_site function"""
+    key = (site_url, user_id)
     try:
-        # Run process_site in a thread pool to avoid blocking the event loop
-        await asyncio.get_event_loop().run_in_executor(None, process_site, site_url, user_id)
+        task = _inflight_process.get(key)
+        if task is None:
+            task = asyncio.ensure_future(_run_process_site(site_url, user_id))
+            _inflight_process[key] = task
+        else:
+            log.debug("[API] process_site already running for %s, joining it", site_url)
+        await asyncio.shield(task)
     except Exception as e:
-        print(f"[API] Error processing site {site_url}: {e}")
+        log.error(f"[API] Error processing site {site_url}: {e}")
+
+# Claim sites where last_processed + interval_hours < now OR never processed.
+# The UPDATE stamps last_processed in the same statement that selects the sites,
+# so an overrunning poll or a second API pod can't pick up the same site again;
+# UPDLOCK + READPAST lets concurrent pollers claim disjoint rows without blocking.
+# OUTPUT returns the previous last_processed for logging.
+# Constant text (no parameters), so SQL Server reuses its cached plan every poll.
+# next_due is a persisted computed column (see db.create_tables) indexed with
+# is_active, so this is an index seek rather than a scan of sites.
+# Capped per poll and most-overdue-first (never-processed sites sort first) so a
+# large backlog is worked through fairly across polls instead of all at once.
+SCHEDULER_BATCH_SIZE = 500
+SQL_CLAIM_SCHEDULER_SITES = f"""
+    WITH due AS (
+        SELECT TOP ({SCHEDULER_BATCH_SIZE}) site_url, user_id, process_interval_hours, last_processed
+        FROM sites WITH (UPDLOCK, READPAST, ROWLOCK)
+        WHERE is_active = 1 AND next_due <= GETUTCDATE()
+        ORDER BY next_due
+    )
+    UPDATE due SET last_processed = GETUTCDATE()
+    OUTPUT inserted.site_url, inserted.user_id, inserted.process_interval_hours, deleted.last_processed
+"""
+
+# Seconds until the next active site comes due (None when there are no active sites).
+# Overdue sites are clamped to now: DATEDIFF in seconds back to 1900 overflows INT.
+SQL_SECONDS_UNTIL_NEXT_DUE = """
+    SELECT DATEDIFF(second, GETUTCDATE(),
+        CASE WHEN MIN(next_due) < GETUTCDATE() THEN GETUTCDATE() ELSE MIN(next_due) END)
+    FROM sites
+    WHERE is_active = 1
+"""
+
+# Upper bound on the scheduler's sleep, so sites changed outside this process
+# (another API pod, direct DB edits) are still picked up
+SCHEDULER_MAX_SLEEP_SECONDS = 600
+
+# processing_errors older than this are purged by the scheduler about once a day
+ERROR_RETENTION_DAYS = int(os.getenv('ERROR_RETENTION_DAYS', '30'))
+ERROR_PURGE_INTERVAL_SECONDS = 24 * 60 * 60
+
+# Set (via notify_scheduler) to wake the scheduler before its computed wakeup time
+_scheduler_wakeup = asyncio.Event()
+
+def notify_scheduler():
+    """Wake the scheduler to re-check due sites (safe to call from any thread)"""
+    if event_loop:
+        event_loop.call_soon_threadsafe(_scheduler_wakeup.set)
+
+def _claim_due_sites():
+    """
+    Claim the sites that need reprocessing and return (sites, seconds until the
+    next site comes due). Blocking - run off the event loop.
+    """
+    # Release the connection before processing - sites can take minutes
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(SQL_CLAIM_SCHEDULER_SITES)
+        sites = cursor.fetchall()
+        conn.commit()
+        cursor.execute(SQL_SECONDS_UNTIL_NEXT_DUE)
+        next_due_seconds = cursor.fetchone()[0]
+    return sites, next_due_seconds
 
 async def scheduler_loop():
     """Background scheduler that periodically checks sites for reprocessing"""
     global scheduler_running
 
-    print("[SCHEDULER] Started background scheduler")
+    log.info("[SCHEDULER] Started background scheduler")
+
+    loop = asyncio.get_running_loop()
+    next_error_purge = loop.time()
 
     while scheduler_running:
+        # Retry in a minute if the claim fails
+        wake_at = loop.time() + 60
         try:
-            conn = db.get_connection()
-            cursor = conn.cursor()
-
-            # Get sites that need reprocessing (with user_id)
-            # Check sites where last_processed + interval_hours < now OR never processed
-            cursor.execute("""
-                SELECT site_url, user_id, process_interval_hours, last_processed
-                FROM sites
-                WHERE is_active = 1
-                  AND (
-                    last_processed IS NULL
-                    OR DATEADD(hour, process_interval_hours, last_processed) <= GETUTCDATE()
-                  )
-            """)
-
-            sites_to_process = cursor.fetchall()
+            if loop.time() >= next_error_purge:
+                next_error_purge = loop.time() + ERROR_PURGE_INTERVAL_SECONDS
+                purged = await db.run_sync(db.purge_old_errors, ERROR_RETENTION_DAYS)
+                if purged:
+                    log.info(f"[SCHEDULER] Purged {purged} processing errors older than {ERROR_RETENTION_DAYS} days")
+
+            # pymssql calls block, so the claim runs on the loop's executor
+            sites_to_process, next_due_seconds = await loop.run_in_executor(None, _claim_due_sites)
+
+            if len(sites_to_process) >= SCHEDULER_BATCH_SIZE:
+                wake_at = loop.time()  # More due sites than one batch - claim again right away
+            elif next_due_seconds is None:
+                wake_at = loop.time() + SCHEDULER_MAX_SLEEP_SECONDS
+            else:
+                wake_at = loop.time() + min(SCHEDULER_MAX_SLEEP_SECONDS, max(1, next_due_seconds))
 
             if sites_to_process:
-                print(f"[SCHEDULER] Found {len(sites_to_process)} sites to process")
-
-                # Create tasks for all sites to process concurrently
-                tasks = []
-                for site_url, user_id, interval_hours, last_processed in sites_to_process:
-                    if last_processed:
-                        time_since = datetime.utcnow() - last_processed
-                        print(f"[SCHEDULER] Processing {site_url} for user {user_id} (last processed {time_since} ago)")
-                    else:
-                        print(f"[SCHEDULER] Processing {site_url} for user {user_id} (never processed before)")
-
-                    # Add to task list for concurrent processing
-                    tasks.append(process_site_async(site_url, user_id))
-
-                # Process all sites concurrently
-                if tasks:
-                    # Use return_exceptions=True to prevent one site error from killing all
-                    results = await asyncio.gather(*tasks, return_exceptions=True)
-                    for i, result in enumerate(results):
-                        if isinstance(result, Exception):
-                            print(f"[SCHEDULER] Error processing site {sites_to_process[i][0]}: {result}")
-
-            conn.close()
+                log.info(f"[SCHEDULER] Found {len(sites_to_process)} sites to process")
+
+                # Process the batch concurrently. process_site_async caps how many sites
+                # run at once (PROCESS_SITE_WORKERS) and logs its own errors, so one
+                # failing site doesn't affect the rest of the group.
+                async with asyncio.TaskGroup() as tasks:
+                    for site_url, user_id, interval_hours, last_processed in sites_to_process:
+                        if last_processed:
+                            time_since = datetime.utcnow() - last_processed
+                            log.info(f"[SCHEDULER] Processing {site_url} for user {user_id} (last processed {time_since} ago)")
+                        else:
+                            log.info(f"[SCHEDULER] Processing {site_url} for user {user_id} (never processed before)")
+
+                        tasks.create_task(process_site_async(site_url, user_id))
 
         except Exception as e:
-            print(f"[SCHEDULER] Error in scheduler loop: {e}")
-            # Try to close connection if it exists
-            try:
-                if 'conn' in locals() and conn:
-                    conn.close()
-            except:
-                pass
+            log.error(f"[SCHEDULER] Error in scheduler loop: {e}")
 
-        # Sleep for 60 seconds between checks
-        await asyncio.sleep(60)
+        # Sleep until the next site is due, or until notify_scheduler() wakes us
+        try:
+            await asyncio.wait_for(_scheduler_wakeup.wait(), timeout=max(0, wake_at - loop.time()))
+        except asyncio.TimeoutError:
+            pass
+        _scheduler_wakeup.clear()
 
-    print("[SCHEDULER] Stopped")
+    log.info("[SCHEDULER] Stopped")
 
 def start_scheduler():
     """Start the background scheduler task"""
     global scheduler_task, scheduler_running, event_loop
 
     if scheduler_task and not scheduler_task.done():
-        print("[SCHEDULER] Already running")
+        log.info("[SCHEDULER] Already running")
         return
 
     scheduler_running = True
     if event_loop:
         scheduler_task = asyncio.run_coroutine_threadsafe(scheduler_loop(), event_loop)
-        print("[SCHEDULER] Starting background scheduler task")
+        log.info("[SCHEDULER] Starting background scheduler task")
 
 def stop_scheduler():
     """Stop the background scheduler task"""
     global scheduler_running, scheduler_task
     scheduler_running = False
-    print("[SCHEDULER] Stopping scheduler...")
+    log.info("[SCHEDULER] Stopping scheduler...")
     if scheduler_task:
         scheduler_task.cancel()
 
@@ -1047,76 +1327,100 @@ def run_event_loop():
     """Run the asyncio event loop in a separate thread"""
     global event_loop
     event_loop = asyncio.new_event_loop()
+    # Small pool for the scheduler's own DB calls; process_site has _PROCESS_EXECUTOR
+    event_loop.set_default_executor(ThreadPoolExecutor(max_workers=4, thread_name_prefix='scheduler-io'))
     asyncio.set_event_loop(event_loop)
     event_loop.run_forever()
 
-if __name__ == '__main__':
-    # Ensure database tables exist
+class StartupCheckError(Exception):
+    """A startup connectivity check failed (message is printed before exiting)"""
+
+def _check_database():
+    """Ensure database tables exist"""
     print("[STARTUP] Testing database connection...")
-    conn = db.get_connection()
-    db.create_tables(conn)
-    conn.close()
+    with db.connection() as conn:
+        db.create_tables(conn)
+    db.get_pool().fill()
     print("[STARTUP] ✓ Database connection successful")
 
-    # Test Queue connectivity
-    queue_type = os.getenv('QUEUE_TYPE', 'file')
-    if queue_type == 'servicebus':
-        print("[STARTUP] Testing Service Bus connection...")
-        try:
-            from azure.servicebus import ServiceBusClient
-            from azure.identity import DefaultAzureCredential
-
-            conn_str = os.getenv('AZURE_SERVICEBUS_CONNECTION_STRING')
-            namespace = os.getenv('AZURE_SERVICEBUS_NAMESPACE')
-            queue_name = os.getenv('AZURE_SERVICE_BUS_QUEUE_NAME', 'crawler-queue')
+def _check_servicebus():
+    """Test Service Bus connectivity by peeking at the queue"""
+    print("[STARTUP] Testing Service Bus connection...")
+    try:
+        from azure.servicebus import ServiceBusClient
+
+        conn_str = os.getenv('AZURE_SERVICEBUS_CONNECTION_STRING')
+        namespace = os.getenv('AZURE_SERVICEBUS_NAMESPACE')
+        queue_name = os.getenv('AZURE_SERVICE_BUS_QUEUE_NAME', 'crawler-queue')
+
+        if conn_str:
+            client = ServiceBusClient.from_connection_string(conn_str)
+            print("[STARTUP] Using Service Bus connection string")
+        elif namespace:
+            credential = get_azure_credential()
+            fully_qualified_namespace = namespace if '.servicebus.windows.net' in namespace else f"{namespace}.servicebus.windows.net"
+            client = ServiceBusClient(fully_qualified_namespace, credential)
+            print(f"[STARTUP] Using Azure AD auth for namespace: {fully_qualified_namespace}")
+        else:
+            raise StartupCheckError("[STARTUP] ✗ Service Bus not configured - no connection string or namespace found")
+
+        # Test connection by peeking at queue
+        with client.get_queue_receiver(queue_name, max_wait_time=5) as receiver:
+            receiver.peek_messages(max_message_count=1)
+        print(f"[STARTUP] ✓ Service Bus connection successful (queue: {queue_name})")
+    except StartupCheckError:
+        raise
+    except Exception as e:
+        raise StartupCheckError(f"[STARTUP] ✗ Service Bus connection failed: {str(e)}")
 
-            if conn_str:
-                client = ServiceBusClient.from_connection_string(conn_str)
-                print("[STARTUP] Using Service Bus connection string")
-            elif namespace:
-                credential = DefaultAzureCredential()
-                fully_qualified_namespace = namespace if '.servicebus.windows.net' in namespace else f"{namespace}.servicebus.windows.net"
-                client = ServiceBusClient(fully_qualified_namespace, credential)
-                print(f"[STARTUP] Using Azure AD auth for namespace: {fully_qualified_namespace}")
-            else:
-                print("[STARTUP] ✗ Service Bus not configured - no connection string or namespace found")
-                sys.exit(1)
+def _check_storage_queue():
+    """Test Storage Queue connectivity and create the queue if needed"""
+    print("[STARTUP] Testing Storage Queue connection...")
+    try:
+        from azure.storage.queue import QueueServiceClient
 
-            # Test connection by peeking at queue
-            with client.get_queue_receiver(queue_name, max_wait_time=5) as receiver:
-                receiver.peek_messages(max_message_count=1)
-            print(f"[STARTUP] ✓ Service Bus connection successful (queue: {queue_name})")
-        except Exception as e:
-            print(f"[STARTUP] ✗ Service Bus connection failed: {str(e)}")
-            sys.exit(1)
-    elif queue_type == 'storage':
-        print("[STARTUP] Testing Storage Queue connection...")
-        try:
-            from azure.storage.queue import QueueServiceClient
-            from azure.identity import DefaultAzureCredential
+        storage_account = os.getenv('AZURE_STORAGE_ACCOUNT_NAME')
+        queue_name = os.getenv('AZURE_STORAGE_QUEUE_NAME', 'crawler-jobs')
 
-            storage_account = os.getenv('AZURE_STORAGE_ACCOUNT_NAME')
-            queue_name = os.getenv('AZURE_STORAGE_QUEUE_NAME', 'crawler-jobs')
+        if not storage_account:
+            raise StartupCheckError("[STARTUP] ✗ Storage Queue not configured - AZURE_STORAGE_ACCOUNT_NAME not set")
 
-            if not storage_account:
-                print("[STARTUP] ✗ Storage Queue not configured - AZURE_STORAGE_ACCOUNT_NAME not set")
-                sys.exit(1)
+        account_url = f"https://{storage_account}.queue.core.windows.net"
+        credential = get_azure_credential()
+        service_client = QueueServiceClient(account_url=account_url, credential=credential)
+        queue_client = service_client.get_queue_client(queue_name)
 
-            account_url = f"https://{storage_account}.queue.core.windows.net"
-            credential = DefaultAzureCredential()
-            service_client = QueueServiceClient(account_url=account_url, credential=credential)
-            queue_client = service_client.get_queue_client(queue_name)
+        # Test connection by checking queue properties
+        queue_client.get_queue_properties()
+        print(f"[STARTUP] ✓ Storage Queue connection successful (queue: {queue_name})")
 
-            # Test connection by checking queue properties
-            queue_client.get_queue_properties()
-            print(f"[STARTUP] ✓ Storage Queue connection successful (queue: {queue_name})")
+        # Ensure queue exists (create if needed)
+        from queue_interface_storage import ensure_queue_exists
+        ensure_queue_exists(storage_account, queue_name)
+    except StartupCheckError:
+        raise
+    except Exception as e:
+        raise StartupCheckError(f"[STARTUP] ✗ Storage Queue connection failed: {str(e)}")
 
-            # Ensure queue exists (create if needed)
-            from queue_interface_storage import ensure_queue_exists
-            ensure_queue_exists(storage_account, queue_name)
-        except Exception as e:
-            print(f"[STARTUP] ✗ Storage Queue connection failed: {str(e)}")
+if __name__ == '__main__':
+    # Run the database and queue checks concurrently - each is dominated by a
+    # TLS handshake + login, so startup waits for the slowest rather than the sum
+    checks = [_check_database]
+    queue_type = os.getenv('QUEUE_TYPE', 'file')
+    if queue_type == 'servicebus':
+        checks.append(_check_servicebus)
+    elif queue_type == 'storage':
+        checks.append(_check_storage_queue)
+
+    with ThreadPoolExecutor(max_workers=len(checks), thread_name_prefix='startup-check') as startup_pool:
+        futures = [startup_pool.submit(check) for check in checks]
+    for future in futures:
+        error = future.exception()
+        if isinstance(error, StartupCheckError):
+            print(str(error))
             sys.exit(1)
+        if error is not None:
+            raise error
 
     # Start asyncio event loop in background
     import threading
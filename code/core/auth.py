@@ -2,12 +2,17 @@
 Authentication module supporting both OAuth and API key authentication.
 """
 
+import logging
 import os
+import threading
 from functools import wraps
-from flask import request, redirect, url_for, session, jsonify
+from flask import request, redirect, url_for, session, jsonify, g
 from flask_login import LoginManager, UserMixin, login_user, logout_user, current_user
 from authlib.integrations.flask_client import OAuth
 import db
+from cache import TTLCache
+
+log = logging.getLogger('auth')
 
 # Flask-Login setup
 login_manager = LoginManager()
@@ -19,6 +24,13 @@ oauth = OAuth()
 github = None
 microsoft = None
 
+# Authenticated user lookups happen on every request; cache them briefly.
+# Keys are only changed outside the API (e.g. create_test_user.py), so a
+# replaced key keeps working in a running server for up to the 60s TTL.
+_user_cache = TTLCache(maxsize=10000, ttl=60)     # user_id -> user row dict
+_api_key_cache = TTLCache(maxsize=10000, ttl=60)  # api_key -> user_id
+_login_touched = TTLCache(maxsize=10000, ttl=60)  # user_id -> True while last_login is fresh
+
 
 def init_auth(app):
     """Initialize authentication (Flask-Login and OAuth providers)"""
@@ -46,9 +58,9 @@ def init_auth(app):
             api_base_url='https://api.github.com/',
             client_kwargs={'scope': 'user:email'},
         )
-        print("[AUTH] GitHub OAuth configured")
+        log.info("[AUTH] GitHub OAuth configured")
     else:
-        print("[AUTH] GitHub OAuth not configured (missing GITHUB_CLIENT_ID or GITHUB_CLIENT_SECRET)")
+        log.warning("[AUTH] GitHub OAuth not configured (missing GITHUB_CLIENT_ID or GITHUB_CLIENT_SECRET)")
 
     # Microsoft OAuth configuration
     microsoft_client_id = os.getenv('MICROSOFT_CLIENT_ID')
@@ -62,9 +74,22 @@ def init_auth(app):
             server_metadata_url=f'https://login.microsoftonline.com/{microsoft_tenant_id}/v2.0/.well-known/openid-configuration',
             client_kwargs={'scope': 'openid email profile'},
         )
-        print("[AUTH] Microsoft OAuth configured")
+        log.info("[AUTH] Microsoft OAuth configured")
+        # Authlib fetches the OpenID metadata and JWKS lazily on the first sign-in;
+        # fetch them now so that login doesn't wait on two extra HTTPS round-trips
+        threading.Thread(target=_warm_oauth_metadata, args=(microsoft,), daemon=True,
+                         name='oauth-metadata-warmup').start()
     else:
-        print("[AUTH] Microsoft OAuth not configured (missing MICROSOFT_CLIENT_ID or MICROSOFT_CLIENT_SECRET)")
+        log.warning("[AUTH] Microsoft OAuth not configured (missing MICROSOFT_CLIENT_ID or MICROSOFT_CLIENT_SECRET)")
+
+
+def _warm_oauth_metadata(client):
+    """Pre-load an OAuth client's server metadata and JWKS (first sign-in retries on failure)"""
+    try:
+        client.fetch_jwk_set()
+        log.info(f"[AUTH] Loaded {client.name} OAuth metadata")
+    except Exception as e:
+        log.warning(f"[AUTH] Could not pre-load {client.name} OAuth metadata: {e}")
 
 
 class User(UserMixin):
@@ -80,22 +105,43 @@ class User(UserMixin):
     @staticmethod
     def get(user_id):
         """Get user by ID"""
-        conn = db.get_connection()
-        try:
-            user_data = db.get_user_by_id(conn, user_id)
-            if user_data:
-                return User(
-                    user_data['user_id'],
-                    user_data['email'],
-                    user_data['name'],
-                    user_data['provider'],
-                    user_data['api_key']
-                )
-        finally:
-            conn.close()
+        user_data = get_user_data(user_id)
+        if user_data:
+            return User(
+                user_data['user_id'],
+                user_data['email'],
+                user_data['name'],
+                user_data['provider'],
+                user_data['api_key']
+            )
         return None
 
 
+def get_user_data(user_id):
+    """Get a user's row as a dict, served from cache when possible"""
+    user_data = _user_cache.get(user_id)
+    if user_data is None:
+        with db.connection() as conn:
+            user_data = db.get_user_by_id(conn, user_id)
+        if user_data:
+            _user_cache.set(user_id, user_data)
+    return user_data
+
+
+def invalidate_user(user_id):
+    """Drop cached data for a user after their row changes"""
+    _user_cache.pop(user_id)
+
+
+def _touch_last_login(conn, user_id):
+    """Update a user's last_login, at most once a minute per user"""
+    if _login_touched.get(user_id):
+        return
+    db.update_user_login(conn, user_id)
+    _login_touched.set(user_id, True)
+    invalidate_user(user_id)
+
+
 @login_manager.user_loader
 def load_user(user_id):
     """Load user for Flask-Login"""
@@ -106,32 +152,43 @@ def get_current_user():
     """
     Get current user ID from either Flask session (OAuth) or API key header.
     Returns user_id string or None.
+    The result is memoized for the rest of the request.
     """
+    if 'auth_user_id' in g:
+        return g.auth_user_id
+    g.auth_user_id = _authenticate_request()
+    return g.auth_user_id
+
+
+def _authenticate_request():
+    """Resolve the user for the current request (session first, then API key)"""
     # Check if user is logged in via OAuth session
     if current_user.is_authenticated:
-        print(f"[AUTH] User authenticated via session: {current_user.id}")
+        log.debug("[AUTH] User authenticated via session: %s", current_user.id)
         return current_user.id
 
     # Check for API key in headers
     api_key = request.headers.get('X-API-Key')
     if api_key:
-        print(f"[AUTH] Checking API key: {api_key[:10]}...")
-        conn = db.get_connection()
+        user_id = _api_key_cache.get(api_key)
+        if user_id is not None:
+            return user_id
+
+        log.debug("[AUTH] Checking API key: %s...", api_key[:10])
         try:
-            user_data = db.get_user_by_api_key(conn, api_key)
-            if user_data:
-                print(f"[AUTH] API key valid for user: {user_data['user_id']}")
-                # Update last login
-                db.update_user_login(conn, user_data['user_id'])
-                return user_data['user_id']
-            else:
-                print(f"[AUTH] API key not found in database")
+            with db.connection() as conn:
+                user_data = db.get_user_by_api_key(conn, api_key)
+                if user_data:
+                    log.debug("[AUTH] API key valid for user: %s", user_data['user_id'])
+                    _touch_last_login(conn, user_data['user_id'])
+                    _api_key_cache.set(api_key, user_data['user_id'])
+                    return user_data['user_id']
+                else:
+                    log.info("[AUTH] API key not found in database")
         except Exception as e:
-            print(f"[AUTH] Error validating API key: {e}")
-        finally:
-            conn.close()
+            log.error(f"[AUTH] Error validating API key: {e}")
     else:
-        print(f"[AUTH] No authentication provided (no session, no API key)")
+        log.debug("[AUTH] No authentication provided (no session, no API key)")
 
     return None
 
@@ -162,28 +219,15 @@ def get_or_create_user(user_id, email, name, provider):
     Get existing user or create new user with auto-generated API key.
     Returns User object.
     """
-    print(f"[AUTH] get_or_create_user: user_id={user_id}, email={email}, provider={provider}")
-    conn = db.get_connection()
-    try:
-        # Try to get existing user
-        user_data = db.get_user_by_id(conn, user_id)
+    log.info(f"[AUTH] get_or_create_user: user_id={user_id}, email={email}, provider={provider}")
+    invalidate_user(user_id)
+    with db.connection() as conn:
+        user_data, created = db.upsert_user_login(conn, user_id, email, name, provider)
 
-        if user_data:
-            print(f"[AUTH] Existing user found: {user_id}")
-            # Update last login
-            db.update_user_login(conn, user_id)
+        if created:
+            log.info(f"[AUTH] New user created with API key: {user_data['api_key'][:10]}...")
         else:
-            print(f"[AUTH] Creating new user: {user_id}")
-            # Create new user with auto-generated API key
-            api_key = db.create_user(conn, user_id, email, name, provider)
-            print(f"[AUTH] New user created with API key: {api_key[:10]}...")
-            user_data = {
-                'user_id': user_id,
-                'email': email,
-                'name': name,
-                'provider': provider,
-                'api_key': api_key
-            }
+            log.info(f"[AUTH] Existing user found: {user_id}")
 
         return User(
             user_data['user_id'],
@@ -192,5 +236,3 @@ def get_or_create_user(user_id, email, name, provider):
             user_data['provider'],
             user_data['api_key']
         )
-    finally:
-        conn.close()
@@ -1,14 +1,35 @@
+import asyncio
+import atexit
 import pymssql
 from datetime import datetime
+import functools
+import json
+import logging
 import os
+import queue
 import threading
-from collections import defaultdict
+import time
+import weakref
+from contextlib import contextmanager
+from dataclasses import dataclass
+from contextvars import ContextVar
 import re
 import config  # This will automatically load .env file
 
-# Per-site semaphores to prevent concurrent operations on the same site
-_site_locks = defaultdict(lambda: threading.Semaphore(1))
-_lock_mutex = threading.Lock()  # Mutex to protect the _site_locks dictionary
+log = logging.getLogger('db')
+
+# Per-(site, user) locks to prevent concurrent operations on the same site's rows.
+# Every write they guard is scoped by site_url AND user_id, so different users
+# crawling the same site don't contend.
+# update_site_files only runs on request/executor threads (the API's event loop
+# hands process_site to its executor), so a thread lock never blocks the loop.
+# Weak values: a site's lock is dropped once no caller holds a reference to it,
+# so the map doesn't grow with every site URL ever seen.
+_site_locks = weakref.WeakValueDictionary()
+_lock_mutex = threading.Lock()  # Serializes creating new entries in _site_locks
+
+# Optional http(s):// then optional www., capturing the rest minus trailing slashes
+_SITE_URL_RE = re.compile(r'(?:https?://)?(?:www\.)?(.*?)/*\Z', re.DOTALL)
 
 def normalize_site_url(site_url):
     """
@@ -22,24 +43,27 @@ def normalize_site_url(site_url):
     if not site_url:
         return site_url
 
-    # Remove protocol (http:// or https://)
-    url = re.sub(r'^https?://', '', site_url)
-
-    # Remove www. prefix
-    url = re.sub(r'^www\.', '', url)
-
-    # Remove trailing slash
-    url = url.rstrip('/')
-
-    return url
-
-def get_site_lock(site_url):
-    """Get or create a semaphore for a specific site"""
+    # Protocol, www. prefix and trailing slashes stripped in a single match
+    return _SITE_URL_RE.match(site_url).group(1)
+
+def get_site_lock(site_url, user_id):
+    """Get or create the lock for a user's site (keep a reference while using it)"""
+    key = (site_url, user_id)
+    # Fast path without the mutex: the lock already exists and is in use
+    lock = _site_locks.get(key)
+    if lock is not None:
+        return lock
+    # WeakValueDictionary.setdefault isn't atomic, so creation stays under the mutex
     with _lock_mutex:
-        return _site_locks[site_url]
-
-def get_connection():
-    """Get connection to Azure SQL Database using pymssql (simpler than ODBC)"""
+        lock = _site_locks.get(key)
+        if lock is None:
+            lock = threading.Lock()
+            _site_locks[key] = lock
+        return lock
+
+@functools.lru_cache(maxsize=1)
+def _db_config():
+    """Read the connection settings once per process: (server, database, username, password)"""
     server = os.getenv('DB_SERVER') or os.getenv('AZURE_SQL_SERVER')
     database = os.getenv('DB_DATABASE') or os.getenv('AZURE_SQL_DATABASE')
     username = os.getenv('DB_USERNAME') or os.getenv('AZURE_SQL_USERNAME')
@@ -49,6 +73,12 @@ def get_connection():
     if ':' in server:
         server = server.split(':')[0]
 
+    return server, database, username, password
+
+def get_connection():
+    """Get connection to Azure SQL Database using pymssql (simpler than ODBC)"""
+    server, database, username, password = _db_config()
+
     # Simple connection using pymssql - no ODBC complexity
     # TDS version and encryption configured in /etc/freetds/freetds.conf
     conn = pymssql.connect(
@@ -59,6 +89,202 @@ def get_connection():
     )
     return conn
 
+
+class ConnectionPool:
+    """
+    Thread-safe pool of pymssql connections shared by the whole process.
+
+    Connections are opened lazily (up to max_size), handed out to callers and
+    rolled back + kept open when returned, so request handlers skip the
+    TCP/TLS/login handshake that get_connection() pays on every call.
+    Connections idle for more than ping_after_seconds are checked with a
+    SELECT 1 before being handed out again. fill() pre-opens min_size
+    connections so the first requests after startup don't pay for the handshake.
+    """
+
+    def __init__(self, max_size=10, max_idle_seconds=300, timeout=30, ping_after_seconds=30, min_size=0):
+        self.max_size = max_size
+        self.min_size = min(min_size, max_size)
+        self.max_idle_seconds = max_idle_seconds
+        self.timeout = timeout
+        self.ping_after_seconds = ping_after_seconds
+        self._idle = queue.LifoQueue()  # (conn, returned_at) - LIFO keeps hot connections hot
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def getconn(self):
+        """Borrow a connection, opening a new one if no idle connection is available"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"Timed out waiting for a database connection (pool size {self.max_size})")
+        try:
+            while True:
+                try:
+                    conn, returned_at = self._idle.get_nowait()
+                except queue.Empty:
+                    return get_connection()
+                # Azure SQL drops idle sessions; recycle connections that sat unused too long
+                idle_for = time.monotonic() - returned_at
+                if idle_for < self.max_idle_seconds and (idle_for < self.ping_after_seconds or _is_alive(conn)):
+                    return conn
+                _close_quietly(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, discard=False):
+        """Return a borrowed connection to the pool (or close it if discard is set)"""
+        try:
+            if not discard:
+                try:
+                    # End any open transaction so the next borrower starts clean
+                    conn.rollback()
+                except Exception:
+                    discard = True
+            if discard:
+                _close_quietly(conn)
+            else:
+                self._idle.put((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that borrows a connection and always returns it"""
+        conn = self.getconn()
+        discard = False
+        try:
+            yield conn
+        except (pymssql.OperationalError, pymssql.InterfaceError):
+            # Connection-level failure - don't hand this connection out again
+            discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def fill(self):
+        """Open connections until min_size are idle in the pool"""
+        while self._idle.qsize() < self.min_size:
+            if not self._slots.acquire(blocking=False):
+                return
+            try:
+                conn = get_connection()
+            finally:
+                self._slots.release()
+            self._idle.put((conn, time.monotonic()))
+
+    def close_all(self):
+        """Close all idle connections"""
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            _close_quietly(conn)
+
+
+def _is_alive(conn):
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        return True
+    except Exception:
+        return False
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Get the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    max_size=int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+                    max_idle_seconds=int(os.getenv('DB_POOL_MAX_IDLE_SECONDS', '300')),
+                    min_size=int(os.getenv('DB_POOL_MIN_SIZE', '0'))
+                )
+    return _pool
+
+# Connection borrowed by the enclosing db.connection() block in this thread/task
+_current_connection = ContextVar('db_current_connection', default=None)
+
+@contextmanager
+def connection():
+    """
+    Borrow a pooled database connection:
+
+        with db.connection() as conn:
+            ...
+
+    Nested blocks in the same thread/task reuse the outer block's connection
+    (and transaction) instead of taking a second pool slot.
+    """
+    conn = _current_connection.get()
+    if conn is not None:
+        yield conn
+        return
+
+    with get_pool().connection() as conn:
+        token = _current_connection.set(conn)
+        try:
+            yield conn
+        finally:
+            _current_connection.reset(token)
+
+async def run_sync(fn, *args):
+    """
+    Run a blocking db function as fn(conn, *args) on a pooled connection in a
+    worker thread, so async callers don't stall the event loop:
+
+        sites = await db.run_sync(db.get_all_sites, user_id)
+    """
+    def call():
+        # to_thread copies the caller's context, which may hold a connection an
+        # enclosing connection() block is still using; pymssql connections aren't
+        # thread-safe, so this thread always borrows its own
+        _current_connection.set(None)
+        with connection() as conn:
+            return fn(conn, *args)
+    return await asyncio.to_thread(call)
+
+class PreparedStatement:
+    """
+    SQL with typed @parameters, executed through sp_executesql so SQL Server
+    compiles one cached plan per statement. (pymssql substitutes %s parameters
+    client-side, so a plain execute() sends new SQL text for every value and
+    each one is compiled as a separate ad hoc query.)
+
+        SQL_GET_IDS = PreparedStatement(
+            "SELECT id FROM ids WHERE user_id = @user_id",
+            user_id='VARCHAR(255)')
+        SQL_GET_IDS.execute(cursor, user_id)
+    """
+
+    def __init__(self, sql, **param_types):
+        self.sql = sql
+        self.param_names = list(param_types)
+        declaration = ', '.join(f'@{name} {sql_type}' for name, sql_type in param_types.items())
+        assignments = ''.join(f', @{name} = %s' for name in self.param_names)
+        # Built once: only the parameter values change between executions
+        escaped_sql = sql.replace("'", "''").replace('%', '%%')
+        self.exec_sql = f"EXEC sp_executesql N'{escaped_sql}', N'{declaration}'{assignments}"
+
+    def execute(self, cursor, *params):
+        """Execute with positional values in the order the parameters were declared"""
+        if len(params) != len(self.param_names):
+            raise ValueError(f"Expected {len(self.param_names)} parameters, got {len(params)}")
+        cursor.execute(self.exec_sql, params)
+        return cursor
+
 def create_tables(conn):
     """Create tables if they don't exist"""
     cursor = conn.cursor()
@@ -97,6 +323,26 @@ def create_tables(conn):
     )
     """)
 
+    # When each site is next due, so the scheduler's "due sites" poll can seek
+    # on (is_active, next_due) instead of evaluating DATEADD on every row.
+    # Never-processed sites are due from 1900 (CONVERT style 112 keeps it deterministic).
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sys.columns WHERE object_id = OBJECT_ID('sites') AND name = 'next_due')
+    ALTER TABLE sites ADD next_due AS
+        DATEADD(hour, process_interval_hours, ISNULL(last_processed, CONVERT(DATETIME, '19000101', 112))) PERSISTED
+    """)
+
+    cursor.execute("""
+    IF EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_sites_last_processed' AND object_id = OBJECT_ID('sites'))
+    DROP INDEX IX_sites_last_processed ON sites
+    """)
+
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_sites_due' AND object_id = OBJECT_ID('sites'))
+    CREATE INDEX IX_sites_due ON sites (is_active, next_due)
+        INCLUDE (process_interval_hours, last_processed)
+    """)
+
     cursor.execute("""
     IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'files')
     CREATE TABLE files (
@@ -123,8 +369,46 @@ def create_tables(conn):
     )
     """)
 
+    # Lookups by site (site files), by file (file IDs) and by ID (reference counts)
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_files_site_user_active' AND object_id = OBJECT_ID('files'))
+    CREATE INDEX IX_files_site_user_active ON files (site_url, user_id, is_active)
+        INCLUDE (file_url, schema_map)
+    """)
+
+    # id is a key column (not INCLUDE) so update_file_ids' NOT EXISTS probe is a seek too
     cursor.execute("""
-    CREATE TABLE IF NOT EXISTS processing_errors (
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_ids_file_user' AND object_id = OBJECT_ID('ids'))
+    CREATE INDEX IX_ids_file_user ON ids (file_url, user_id, id)
+    """)
+
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_ids_id_user' AND object_id = OBJECT_ID('ids'))
+    CREATE INDEX IX_ids_id_user ON ids (id, user_id)
+    """)
+
+    # Distinct (site, ID) pairs over active files, maintained by SQL Server as
+    # ids/files change, so get_site_status counts a site's IDs from this index
+    # instead of joining files to ids and de-duplicating on every call.
+    # CREATE VIEW must be alone in its batch, hence EXEC.
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sys.views WHERE name = 'vw_site_ids')
+    EXEC('CREATE VIEW dbo.vw_site_ids WITH SCHEMABINDING AS
+        SELECT f.user_id, f.site_url, i.id, COUNT_BIG(*) AS file_count
+        FROM dbo.files f
+        JOIN dbo.ids i ON i.file_url = f.file_url AND i.user_id = f.user_id
+        WHERE f.is_active = 1
+        GROUP BY f.user_id, f.site_url, i.id')
+    """)
+
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_vw_site_ids' AND object_id = OBJECT_ID('vw_site_ids'))
+    CREATE UNIQUE CLUSTERED INDEX IX_vw_site_ids ON vw_site_ids (user_id, site_url, id)
+    """)
+
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'processing_errors')
+    CREATE TABLE processing_errors (
         id INT IDENTITY(1,1) PRIMARY KEY,
         file_url VARCHAR(500) NOT NULL,
         user_id VARCHAR(255) NOT NULL,
@@ -136,17 +420,105 @@ def create_tables(conn):
     )
     """)
 
-    conn.commit()
+    cursor.execute("""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_errors_file_user_time' AND object_id = OBJECT_ID('processing_errors'))
+    CREATE INDEX IX_errors_file_user_time ON processing_errors (file_url, user_id, occurred_at DESC)
+        INCLUDE (error_type, error_message)
+    """)
 
-def log_processing_error(conn, file_url, user_id, error_type, error_message, error_details=None):
-    """Log a processing error for a file"""
-    cursor = conn.cursor()
+    # Lets purge_old_errors find expired rows without scanning the table
     cursor.execute("""
-        INSERT INTO processing_errors (file_url, user_id, error_type, error_message, error_details)
-        VALUES (%s, %s, %s, %s, %s)
-    """, (file_url, user_id, error_type, error_message, error_details))
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_errors_occurred_at' AND object_id = OBJECT_ID('processing_errors'))
+    CREATE INDEX IX_errors_occurred_at ON processing_errors (occurred_at)
+    """)
+
     conn.commit()
 
+# Processing errors (and clears of a file's errors) are queued and applied in
+# order, in batches, by a background thread, so a crawl full of bad files doesn't
+# pay an INSERT + commit per error. A full queue blocks the caller (backpressure).
+SQL_INSERT_PROCESSING_ERRORS = 'INSERT INTO processing_errors (file_url, user_id, error_type, error_message, error_details) VALUES '
+ERROR_BATCH_SIZE = int(os.getenv('ERROR_BATCH_SIZE', '500'))
+ERROR_FLUSH_INTERVAL = float(os.getenv('ERROR_FLUSH_INTERVAL', '1.0'))
+_error_queue = queue.Queue(maxsize=10000)
+_error_writer = None
+_error_writer_lock = threading.Lock()
+
+def log_processing_error(file_url, user_id, error_type, error_message, error_details=None):
+    """Queue a processing error for the background writer"""
+    _start_error_writer()
+    # Blocks while the queue is full rather than dropping the row
+    _error_queue.put(('log', (file_url, user_id, error_type, error_message, error_details)))
+
+def clear_file_errors(file_url, user_id):
+    """Clear all errors for a file (called when file successfully processes)
+
+    Goes through the same writer queue as log_processing_error, so it always
+    lands after errors logged before it and before errors logged after it.
+    """
+    _start_error_writer()
+    _error_queue.put(('clear', (file_url, user_id)))
+
+def _start_error_writer():
+    """Start the error writer thread on first use"""
+    global _error_writer
+    if _error_writer is not None:
+        return
+    with _error_writer_lock:
+        if _error_writer is None:
+            _error_writer = threading.Thread(target=_error_writer_loop, name='db-error-writer', daemon=True)
+            _error_writer.start()
+            atexit.register(_stop_error_writer)
+
+def _error_writer_loop():
+    """Collect queued operations for up to ERROR_FLUSH_INTERVAL (or ERROR_BATCH_SIZE of them) and apply them"""
+    stopping = False
+    while not stopping:
+        op = _error_queue.get()
+        if op is None:
+            break
+        ops = [op]
+        deadline = time.monotonic() + ERROR_FLUSH_INTERVAL
+        while len(ops) < ERROR_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                op = _error_queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if op is None:
+                stopping = True
+                break
+            ops.append(op)
+        _write_processing_errors(ops)
+
+def _write_processing_errors(ops):
+    """Apply a batch of ('log', row) / ('clear', (file_url, user_id)) operations in order, with one commit"""
+    try:
+        with connection() as conn:
+            cursor = conn.cursor()
+            rows = []
+            for kind, args in ops:
+                if kind == 'log':
+                    rows.append(args)
+                    continue
+                # Insert the errors queued before this clear first, so order is kept
+                if rows:
+                    _multi_row_insert(cursor, SQL_INSERT_PROCESSING_ERRORS, rows)
+                    rows = []
+                cursor.execute('DELETE FROM processing_errors WHERE file_url = %s AND user_id = %s', args)
+            if rows:
+                _multi_row_insert(cursor, SQL_INSERT_PROCESSING_ERRORS, rows)
+            conn.commit()
+    except Exception as e:
+        log.error('[DB] Failed to write %d processing error operations: %s', len(ops), e)
+
+def _stop_error_writer():
+    """Flush queued errors and stop the writer at interpreter exit"""
+    _error_queue.put(None)
+    _error_writer.join(timeout=10)
+
 def get_file_errors(conn, file_url, user_id, limit=50):
     """Get recent errors for a file"""
     cursor = conn.cursor(as_dict=True)
@@ -158,20 +530,94 @@ def get_file_errors(conn, file_url, user_id, limit=50):
     """, (limit, file_url, user_id))
     return cursor.fetchall()
 
-def clear_file_errors(conn, file_url, user_id):
-    """Clear all errors for a file (called when file successfully processes)"""
+def purge_old_errors(conn, retention_days=30, batch_size=5000):
+    """
+    Delete processing errors older than retention_days, returns the number deleted.
+    Deletes in batches (each its own commit) so a large backlog doesn't hold
+    locks on the whole table or grow the log in one transaction.
+    """
     cursor = conn.cursor()
-    cursor.execute("""
-        DELETE FROM processing_errors
-        WHERE file_url = %s AND user_id = %s
-    """, (file_url, user_id))
-    conn.commit()
+    deleted = 0
+    while True:
+        cursor.execute("""
+            DELETE TOP (%s) FROM processing_errors
+            WHERE occurred_at < DATEADD(day, -%s, GETUTCDATE())
+        """, (batch_size, retention_days))
+        conn.commit()
+        deleted += cursor.rowcount
+        if cursor.rowcount < batch_size:
+            return deleted
+
+SQL_GET_SITE_FILES = PreparedStatement(
+    'SELECT file_url FROM files WHERE site_url = @site_url AND user_id = @user_id AND is_active = 1',
+    site_url='VARCHAR(500)', user_id='VARCHAR(255)')
 
 def get_site_files(conn, site_url, user_id):
-    """Get all active files currently associated with a site"""
-    cursor = conn.cursor()
-    cursor.execute('SELECT file_url FROM files WHERE site_url = %s AND user_id = %s AND is_active = 1', (site_url, user_id))
-    return [row[0] for row in cursor.fetchall()]
+    """Yield the URLs of all active files currently associated with a site"""
+    cursor = SQL_GET_SITE_FILES.execute(conn.cursor(), site_url, user_id)
+    # Stream in chunks rather than materializing every row before the caller's set()
+    while True:
+        rows = cursor.fetchmany(2048)
+        if not rows:
+            return
+        for row in rows:
+            yield row[0]
+
+# Subquery expanding a JSON array parameter into VARCHAR(500) rows (typed to match the
+# key columns so comparisons stay seekable). A whole list is one parameter, so an
+# IN (...) over it needs no chunking under the 2100-parameter limit and has one plan.
+IN_JSON_LIST = "SELECT value FROM OPENJSON(%s) WITH (value VARCHAR(500) '$')"
+
+def _json_list(values):
+    """Encode values as the JSON array parameter for IN_JSON_LIST"""
+    return json.dumps(list(values))
+
+def _multi_row_insert(cursor, sql_prefix, rows, max_params=2000, max_rows=1000):
+    """
+    INSERT rows with as few statements as possible: each statement carries one
+    "VALUES (...),(...)" list, kept under SQL Server's 2100 parameter limit and
+    its 1000-row limit for a VALUES list.
+    """
+    if not rows:
+        return
+    columns = len(rows[0])
+    batch_size = max(1, min(max_rows, max_params // columns))
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i:i + batch_size]
+        cursor.execute(
+            _multi_row_sql(sql_prefix, columns, len(batch)),
+            tuple(value for row in batch for value in row)
+        )
+
+@functools.lru_cache(maxsize=64)
+def _multi_row_sql(sql_prefix, columns, row_count):
+    """The "VALUES (%s,...),(%s,...)" statement for row_count rows, built once per shape"""
+    row_placeholder = '(' + ','.join(['%s'] * columns) + ')'
+    return sql_prefix + ','.join([row_placeholder] * row_count)
+
+# Diff a site's active files against the JSON array of current (file_url, schema_map)
+# pairs on the server, like SQL_SYNC_FILE_IDS: removed files are deactivated and
+# new/reactivated ones upserted, and only those URLs come back (via OUTPUT), as two
+# result sets. An unchanged site writes no rows and ships no file list back.
+SQL_SYNC_SITE_FILES = """
+SET NOCOUNT ON;
+DECLARE @current TABLE (file_url VARCHAR(500) PRIMARY KEY, schema_map VARCHAR(500));
+INSERT INTO @current (file_url, schema_map)
+SELECT file_url, MIN(schema_map)
+FROM OPENJSON(%s) WITH (file_url VARCHAR(500) '$[0]', schema_map VARCHAR(500) '$[1]')
+GROUP BY file_url;
+UPDATE files SET is_active = 0 OUTPUT inserted.file_url
+WHERE site_url = %s AND user_id = %s AND is_active = 1
+  AND file_url NOT IN (SELECT file_url FROM @current);
+MERGE files WITH (HOLDLOCK) AS target
+USING @current AS source
+ON target.file_url = source.file_url AND target.user_id = %s
+WHEN MATCHED AND (target.is_active = 0 OR target.site_url IS NULL OR target.site_url <> %s) THEN
+    UPDATE SET is_active = 1, site_url = %s, schema_map = source.schema_map
+WHEN NOT MATCHED THEN
+    INSERT (site_url, user_id, file_url, schema_map, is_active) VALUES (%s, %s, source.file_url, source.schema_map, 1)
+OUTPUT inserted.file_url;
+"""
 
 def update_site_files(conn, site_url, user_id, current_files):
     """Update files for a site, returns (added_files, removed_files)
@@ -181,106 +627,102 @@ def update_site_files(conn, site_url, user_id, current_files):
         user_id: User ID
         current_files: List of triples (site_url, schema_map_url, file_url)
     """
-    # Acquire semaphore for this site to prevent concurrent modifications
-    site_lock = get_site_lock(site_url)
+    # Acquire the lock for this site to prevent concurrent modifications
+    site_lock = get_site_lock(site_url, user_id)
 
     with site_lock:
-        cursor = conn.cursor()
-
-        existing_files = get_site_files(conn, site_url, user_id)
-
-        # Convert current_files to dict for easy lookup
         # Triples format: (site_url, schema_map_url, file_url)
-        current_files_dict = {file_url: schema_map for _, schema_map, file_url in current_files}
-
-        current_set = set(current_files_dict.keys())
-        existing_set = set(existing_files)
-        added = current_set - existing_set
-        removed = existing_set - current_set
-
-        # For "added" files, use MERGE pattern to handle existing records
-        for file_url in added:
-            schema_map = current_files_dict[file_url]
-            # Use MERGE statement for atomic upsert
-            cursor.execute("""
-                MERGE files AS target
-                USING (SELECT %s AS site_url, %s AS user_id, %s AS file_url, %s AS schema_map) AS source
-                ON target.file_url = source.file_url AND target.user_id = source.user_id
-                WHEN MATCHED THEN
-                    UPDATE SET is_active = 1, site_url = source.site_url, schema_map = source.schema_map
-                WHEN NOT MATCHED THEN
-                    INSERT (site_url, user_id, file_url, schema_map, is_active) VALUES (source.site_url, source.user_id, source.file_url, source.schema_map, 1);
-            """, (site_url, user_id, file_url, schema_map))
-
-        if removed:
-            # Mark removed files as inactive instead of deleting
-            cursor.execute(
-                'UPDATE files SET is_active = 0 WHERE site_url = %s AND user_id = %s AND file_url IN ({})'.format(
-                    ','.join('%s' * len(removed))
-                ),
-                tuple([site_url, user_id] + list(removed))
-            )
+        current = json.dumps([(file_url, schema_map) for _, schema_map, file_url in current_files])
+
+        cursor = conn.cursor()
+        cursor.execute(SQL_SYNC_SITE_FILES, (
+            current,
+            site_url, user_id,
+            user_id, site_url, site_url,
+            site_url, user_id
+        ))
+        removed = [row[0] for row in cursor.fetchall()]
+        cursor.nextset()
+        added = [row[0] for row in cursor.fetchall()]
 
         conn.commit()
-        return (list(added), list(removed))
+        return (added, removed)
+
+SQL_GET_FILE_IDS = PreparedStatement(
+    'SELECT id FROM ids WHERE file_url = @file_url AND user_id = @user_id',
+    file_url='VARCHAR(500)', user_id='VARCHAR(255)')
 
 def get_file_ids(conn, file_url, user_id):
     """Get all IDs associated with a file"""
-    cursor = conn.cursor()
-    cursor.execute('SELECT id FROM ids WHERE file_url = %s AND user_id = %s', (file_url, user_id))
-    return {row[0] for row in cursor.fetchall()}
+    cursor = SQL_GET_FILE_IDS.execute(conn.cursor(), file_url, user_id)
+    # Grow the set chunk by chunk instead of materializing the full row list first
+    ids = set()
+    while True:
+        rows = cursor.fetchmany(10000)
+        if not rows:
+            return ids
+        ids.update(row[0] for row in rows)
+
+# Diff a file's stored IDs against the JSON array of current IDs on the server:
+# only the added/removed IDs come back (via OUTPUT), as two result sets.
+# An unchanged file's stats row is only rewritten once it's an hour stale,
+# so re-crawling idle sites doesn't write to files every cycle.
+SQL_SYNC_FILE_IDS = f"""
+SET NOCOUNT ON;
+DECLARE @current TABLE (id VARCHAR(500) PRIMARY KEY);
+DECLARE @changed INT;
+INSERT INTO @current (id) SELECT DISTINCT value FROM ({IN_JSON_LIST}) AS j;
+DELETE FROM ids OUTPUT deleted.id
+WHERE file_url = %s AND user_id = %s AND id NOT IN (SELECT id FROM @current);
+SET @changed = @@ROWCOUNT;
+INSERT INTO ids (file_url, user_id, id) OUTPUT inserted.id
+SELECT %s, %s, c.id FROM @current c
+WHERE NOT EXISTS (SELECT 1 FROM ids i WHERE i.file_url = %s AND i.user_id = %s AND i.id = c.id);
+SET @changed = @changed + @@ROWCOUNT;
+UPDATE files SET last_read_time = GETUTCDATE(), number_of_items = %s
+WHERE file_url = %s AND user_id = %s
+  AND (@changed > 0
+       OR last_read_time IS NULL OR last_read_time < DATEADD(hour, -1, GETUTCDATE())
+       OR number_of_items IS NULL OR number_of_items <> %s);
+"""
 
 def update_file_ids(conn, file_url, user_id, current_ids):
     """Update IDs for a file, returns (added_ids, removed_ids)"""
     cursor = conn.cursor()
-
-    existing_ids = get_file_ids(conn, file_url, user_id)
-
-    added = current_ids - existing_ids
-    removed = existing_ids - current_ids
-
-    if added:
-        cursor.executemany(
-            'INSERT INTO ids (file_url, user_id, id) VALUES (%s, %s, %s)',
-            [(file_url, user_id, id) for id in added]
-        )
-
-    if removed:
-        # If removing all IDs (current_ids is empty), use simple DELETE
-        # to avoid SQL Server's 2100 parameter limit
-        if not current_ids:
-            cursor.execute(
-                'DELETE FROM ids WHERE file_url = %s AND user_id = %s',
-                (file_url, user_id)
-            )
-        else:
-            # Batch deletions to avoid parameter limit (max 2100 params in SQL Server)
-            # Use batches of 500 to be safe
-            removed_list = list(removed)
-            batch_size = 500
-            for i in range(0, len(removed_list), batch_size):
-                batch = removed_list[i:i + batch_size]
-                cursor.execute(
-                    'DELETE FROM ids WHERE file_url = %s AND user_id = %s AND id IN ({})'.format(
-                        ','.join('%s' * len(batch))
-                    ),
-                    tuple([file_url, user_id] + batch)
-                )
-
-    cursor.execute(
-        'UPDATE files SET last_read_time = GETUTCDATE(), number_of_items = %s WHERE file_url = %s AND user_id = %s',
-        (len(current_ids), file_url, user_id)
-    )
+    cursor.execute(SQL_SYNC_FILE_IDS, (
+        _json_list(current_ids),
+        file_url, user_id,
+        file_url, user_id, file_url, user_id,
+        len(current_ids), file_url, user_id, len(current_ids)
+    ))
+    removed = [row[0] for row in cursor.fetchall()]
+    cursor.nextset()
+    added = [row[0] for row in cursor.fetchall()]
 
     conn.commit()
-    return (list(added), list(removed))
+    return (added, removed)
+
+SQL_COUNT_ID_REFERENCES = PreparedStatement(
+    'SELECT COUNT(*) FROM ids WHERE id = @id AND user_id = @user_id',
+    id='VARCHAR(500)', user_id='VARCHAR(255)')
 
 def count_id_references(conn, id, user_id):
     """Count how many files reference an ID"""
-    cursor = conn.cursor()
-    cursor.execute('SELECT COUNT(*) FROM ids WHERE id = %s AND user_id = %s', (id, user_id))
+    cursor = SQL_COUNT_ID_REFERENCES.execute(conn.cursor(), id, user_id)
     return cursor.fetchone()[0]
 
+def count_id_references_many(conn, ids, user_id):
+    """Count how many files reference each ID in one query, returns {id: count}"""
+    counts = dict.fromkeys(ids, 0)
+    if counts:
+        cursor = conn.cursor()
+        cursor.execute(
+            f'SELECT id, COUNT(*) FROM ids WHERE user_id = %s AND id IN ({IN_JSON_LIST}) GROUP BY id',
+            (user_id, _json_list(counts))
+        )
+        counts.update(cursor.fetchall())
+    return counts
+
 def clear_all_data(conn):
     """Clear all data from database tables (for testing)"""
     cursor = conn.cursor()
@@ -300,8 +742,27 @@ def clear_all_data(conn):
     conn.commit()
     print("  ✓ Database cleared successfully")
 
+# Row types for the dashboard listings. Slotted dataclasses are cheaper to build
+# than per-row dicts and orjson serializes them (and their datetimes) natively.
+@dataclass(slots=True)
+class Site:
+    site_url: str
+    process_interval_hours: int
+    last_processed: datetime
+    is_active: bool
+    created_at: datetime
+
+@dataclass(slots=True)
+class SiteStatus:
+    site_url: str
+    is_active: bool
+    last_processed: datetime
+    total_files: int
+    manual_files: int
+    total_ids: int
+
 def get_all_sites(conn, user_id):
-    """Get all sites with their status"""
+    """Get all sites with their status, as Site rows"""
     cursor = conn.cursor()
     cursor.execute("""
         SELECT site_url, process_interval_hours, last_processed, is_active, created_at
@@ -309,16 +770,7 @@ def get_all_sites(conn, user_id):
         WHERE user_id = %s
         ORDER BY site_url
     """, (user_id,))
-    return [
-        {
-            'site_url': row[0],
-            'process_interval_hours': row[1],
-            'last_processed': row[2].isoformat() if row[2] else None,
-            'is_active': bool(row[3]),
-            'created_at': row[4].isoformat() if row[4] else None
-        }
-        for row in cursor.fetchall()
-    ]
+    return [Site(*row) for row in cursor.fetchall()]
 
 def add_site(conn, site_url, user_id, interval_hours=24):
     """Add a new site to monitor"""
@@ -327,66 +779,65 @@ def add_site(conn, site_url, user_id, interval_hours=24):
 
     cursor = conn.cursor()
 
-    # Check if site already exists for this user
-    cursor.execute("SELECT site_url FROM sites WHERE site_url = %s AND user_id = %s", (site_url, user_id))
-    if cursor.fetchone():
-        # Update existing site
-        cursor.execute("""
-            UPDATE sites
-            SET process_interval_hours = %s, is_active = 1
-            WHERE site_url = %s AND user_id = %s
-        """, (interval_hours, site_url, user_id))
-        print(f"Site {site_url} already exists - updated settings")
-    else:
-        # Insert new site
-        cursor.execute("""
-            INSERT INTO sites (site_url, user_id, process_interval_hours)
-            VALUES (%s, %s, %s)
-        """, (site_url, user_id, interval_hours))
-        print(f"Site {site_url} added successfully")
-
+    # Insert or update in one statement; HOLDLOCK makes the existence check and
+    # the write atomic, so two concurrent adds can't both try to INSERT
+    cursor.execute("""
+        MERGE sites WITH (HOLDLOCK) AS target
+        USING (SELECT CAST(%s AS VARCHAR(500)) AS site_url, CAST(%s AS VARCHAR(255)) AS user_id,
+                      %s AS process_interval_hours) AS source
+        ON target.site_url = source.site_url AND target.user_id = source.user_id
+        WHEN MATCHED THEN
+            UPDATE SET process_interval_hours = source.process_interval_hours, is_active = 1
+        WHEN NOT MATCHED THEN
+            INSERT (site_url, user_id, process_interval_hours)
+            VALUES (source.site_url, source.user_id, source.process_interval_hours)
+        OUTPUT $action;
+    """, (site_url, user_id, interval_hours))
+    action = cursor.fetchone()[0]
     conn.commit()
 
+    if action == 'UPDATE':
+        log.info(f"Site {site_url} already exists - updated settings")
+    else:
+        log.info(f"Site {site_url} added successfully")
+
 def remove_site(conn, site_url, user_id):
     """Remove a site (hard delete from database)"""
     cursor = conn.cursor()
 
-    # Delete in correct order due to foreign keys
-    # First delete IDs associated with files from this site
+    # Delete in correct order due to foreign keys: IDs of the site's files,
+    # then the files, then the site - sent as one batch (one round-trip).
+    # The connection's open transaction covers all three; XACT_ABORT makes any
+    # error roll the whole batch back on the server rather than leave it partial.
     cursor.execute("""
-        DELETE FROM ids
-        WHERE user_id = %s AND file_url IN (SELECT file_url FROM files WHERE site_url = %s AND user_id = %s)
-    """, (user_id, site_url, user_id))
+        SET XACT_ABORT ON;
 
-    # Then delete files from this site
-    cursor.execute("""
-        DELETE FROM files WHERE site_url = %s AND user_id = %s
-    """, (site_url, user_id))
+        DELETE i FROM ids i
+        JOIN files f ON i.file_url = f.file_url AND i.user_id = f.user_id
+        WHERE f.site_url = %s AND f.user_id = %s;
 
-    # Finally delete the site itself
-    cursor.execute("""
-        DELETE FROM sites WHERE site_url = %s AND user_id = %s
-    """, (site_url, user_id))
+        DELETE FROM files WHERE site_url = %s AND user_id = %s;
+
+        DELETE FROM sites WHERE site_url = %s AND user_id = %s;
+    """, (site_url, user_id, site_url, user_id, site_url, user_id))
 
     conn.commit()
 
 def add_manual_schema_file(conn, site_url, user_id, file_url, schema_map=None):
     """Add a manual schema file for a site"""
     cursor = conn.cursor()
-    # Check if file exists first
-    cursor.execute("SELECT file_url FROM files WHERE file_url = %s AND user_id = %s", (file_url, user_id))
-    if cursor.fetchone():
-        # Update existing file
-        cursor.execute("""
-            UPDATE files SET is_active = 1, is_manual = 1, schema_map = %s
-            WHERE file_url = %s AND user_id = %s
-        """, (schema_map, file_url, user_id))
-    else:
-        # Insert new file
-        cursor.execute("""
-            INSERT INTO files (site_url, user_id, file_url, schema_map, is_manual, is_active)
-            VALUES (%s, %s, %s, %s, 1, 1)
-        """, (site_url, user_id, file_url, schema_map))
+    # Insert or reactivate in one atomic statement
+    cursor.execute("""
+        MERGE files WITH (HOLDLOCK) AS target
+        USING (SELECT CAST(%s AS VARCHAR(500)) AS site_url, CAST(%s AS VARCHAR(255)) AS user_id,
+                      CAST(%s AS VARCHAR(500)) AS file_url, CAST(%s AS VARCHAR(500)) AS schema_map) AS source
+        ON target.file_url = source.file_url AND target.user_id = source.user_id
+        WHEN MATCHED THEN
+            UPDATE SET is_active = 1, is_manual = 1, schema_map = source.schema_map
+        WHEN NOT MATCHED THEN
+            INSERT (site_url, user_id, file_url, schema_map, is_manual, is_active)
+            VALUES (source.site_url, source.user_id, source.file_url, source.schema_map, 1, 1);
+    """, (site_url, user_id, file_url, schema_map))
     conn.commit()
 
 def remove_schema_file(conn, file_url, user_id):
@@ -398,46 +849,53 @@ def remove_schema_file(conn, file_url, user_id):
     conn.commit()
 
 def get_site_status(conn, user_id):
-    """Get status information for all sites for a specific user"""
+    """Get status information for all sites for a specific user, as SiteStatus rows"""
     cursor = conn.cursor()
+    # File and ID counts are aggregated separately before joining to sites.
+    # (file_url, user_id) is the files key, so COUNT(*) counts distinct files;
+    # vw_site_ids has one row per distinct (site, ID), so COUNT_BIG(*) counts distinct IDs.
     cursor.execute("""
+        WITH file_counts AS (
+            SELECT site_url,
+                   COUNT(*) AS total_files,
+                   SUM(CASE WHEN is_manual = 1 THEN 1 ELSE 0 END) AS manual_files
+            FROM files
+            WHERE user_id = %s AND is_active = 1
+            GROUP BY site_url
+        ),
+        id_counts AS (
+            SELECT site_url, COUNT_BIG(*) AS total_ids
+            FROM vw_site_ids WITH (NOEXPAND)
+            WHERE user_id = %s
+            GROUP BY site_url
+        )
         SELECT
             s.site_url,
             s.is_active,
             s.last_processed,
-            COUNT(DISTINCT f.file_url) as total_files,
-            COUNT(DISTINCT CASE WHEN f.is_manual = 1 THEN f.file_url END) as manual_files,
-            COUNT(DISTINCT i.id) as total_ids
+            ISNULL(fc.total_files, 0) AS total_files,
+            ISNULL(fc.manual_files, 0) AS manual_files,
+            ISNULL(ic.total_ids, 0) AS total_ids
         FROM sites s
-        LEFT JOIN files f ON s.site_url = f.site_url AND s.user_id = f.user_id AND f.is_active = 1
-        LEFT JOIN ids i ON f.file_url = i.file_url AND f.user_id = i.user_id
+        LEFT JOIN file_counts fc ON fc.site_url = s.site_url
+        LEFT JOIN id_counts ic ON ic.site_url = s.site_url
         WHERE s.user_id = %s
-        GROUP BY s.site_url, s.is_active, s.last_processed
         ORDER BY s.site_url
-    """, (user_id,))
-    return [
-        {
-            'site_url': row[0],
-            'is_active': bool(row[1]),
-            'last_processed': row[2].isoformat() if row[2] else None,
-            'total_files': row[3],
-            'manual_files': row[4],
-            'total_ids': row[5]
-        }
-        for row in cursor.fetchall()
-    ]
+    """, (user_id, user_id, user_id))
+    return [SiteStatus(*row) for row in cursor.fetchall()]
 
 
 # ========== User Management Functions ==========
 
+SQL_GET_USER_BY_API_KEY = PreparedStatement("""
+    SELECT user_id, email, name, provider, api_key, created_at, last_login
+    FROM users
+    WHERE api_key = @api_key
+""", api_key='VARCHAR(64)')
+
 def get_user_by_api_key(conn, api_key):
     """Get user by API key"""
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT user_id, email, name, provider, api_key, created_at, last_login
-        FROM users
-        WHERE api_key = %s
-    """, (api_key,))
+    cursor = SQL_GET_USER_BY_API_KEY.execute(conn.cursor(), api_key)
     row = cursor.fetchone()
     if row:
         return {
@@ -474,21 +932,43 @@ def get_user_by_id(conn, user_id):
     return None
 
 
-def create_user(conn, user_id, email, name, provider):
-    """Create a new user with auto-generated API key"""
+def upsert_user_login(conn, user_id, email, name, provider):
+    """
+    Record a login: bump last_login for an existing user, or create the user
+    with an auto-generated API key. Returns (user_data, created).
+    """
     import secrets
     cursor = conn.cursor()
 
-    # Generate secure random API key
+    # Generate secure random API key (only stored if the user is new)
     api_key = secrets.token_urlsafe(48)
 
+    # One atomic statement instead of SELECT-then-INSERT/UPDATE
     cursor.execute("""
-        INSERT INTO users (user_id, email, name, provider, api_key, created_at, last_login)
-        VALUES (%s, %s, %s, %s, %s, GETUTCDATE(), GETUTCDATE())
+        MERGE users WITH (HOLDLOCK) AS target
+        USING (SELECT CAST(%s AS VARCHAR(255)) AS user_id) AS source
+        ON target.user_id = source.user_id
+        WHEN MATCHED THEN
+            UPDATE SET last_login = GETUTCDATE()
+        WHEN NOT MATCHED THEN
+            INSERT (user_id, email, name, provider, api_key, created_at, last_login)
+            VALUES (source.user_id, %s, %s, %s, %s, GETUTCDATE(), GETUTCDATE())
+        OUTPUT $action, inserted.user_id, inserted.email, inserted.name, inserted.provider,
+               inserted.api_key, inserted.created_at, inserted.last_login;
     """, (user_id, email, name, provider, api_key))
+    row = cursor.fetchone()
     conn.commit()
 
-    return api_key
+    user_data = {
+        'user_id': row[1],
+        'email': row[2],
+        'name': row[3],
+        'provider': row[4],
+        'api_key': row[5],
+        'created_at': row[6],
+        'last_login': row[7]
+    }
+    return user_data, row[0] == 'INSERT'
 
 
 def update_user_login(conn, user_id):
@@ -4,15 +4,22 @@ Minimal implementation adapted from NLWeb
 """
 
 from typing import List, Optional
-from openai import AsyncAzureOpenAI
+from openai import AsyncAzureOpenAI, APIConnectionError, APIStatusError, InternalServerError, RateLimitError
 import asyncio
+import httpx
+import random
 import time
 
+# Transient failures worth retrying: 429s, 5xx responses, and connection errors/timeouts
+RETRYABLE_ERRORS = (RateLimitError, InternalServerError, APIConnectionError)
+
 
 class AzureOpenAIEmbedding:
     """Azure OpenAI embedding provider"""
 
-    def __init__(self, endpoint: str, api_key: str, deployment: str = "text-embedding-3-small"):
+    def __init__(self, endpoint: str, api_key: str, deployment: str = "text-embedding-3-small",
+                 max_inputs: int = 2048, max_tokens: int = 8191, max_concurrency: int = 8,
+                 dimensions: Optional[int] = None, max_retries: int = 8):
         """
         Initialize Azure OpenAI embedding client
 
@@ -20,13 +27,32 @@ class AzureOpenAIEmbedding:
             endpoint: Azure OpenAI endpoint URL
             api_key: Azure OpenAI API key
             deployment: Deployment name for the embedding model
+            max_inputs: Maximum texts per embeddings request
+            max_tokens: Approximate token budget per embeddings request
+            max_concurrency: Maximum embeddings requests in flight at once
+            dimensions: Vector size to request (text-embedding-3 models can return
+                shortened vectors); None keeps the model's default of 1536
+            max_retries: Maximum retries for rate limits and transient failures
         """
         self.client = AsyncAzureOpenAI(
             azure_endpoint=endpoint,
             api_key=api_key,
-            api_version="2024-02-01"  # Use stable API version
+            api_version="2024-02-01",  # Use stable API version
+            # One pooled, keep-alive HTTP client for all requests from this provider
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+                timeout=httpx.Timeout(30.0, connect=5.0)
+            ),
+            max_retries=0  # Retries are handled by _create_embeddings
         )
         self.deployment = deployment
+        self.max_inputs = max_inputs
+        self.max_tokens = max_tokens
+        self.max_concurrency = max_concurrency
+        self.dimensions = dimensions
+        self.max_retries = max_retries
+        # Only send `dimensions` when configured - older models reject the parameter
+        self._create_kwargs = {'dimensions': dimensions} if dimensions else {}
 
     async def get_embedding(self, text: str) -> List[float]:
         """
@@ -39,60 +65,115 @@ class AzureOpenAIEmbedding:
             List of floating point numbers representing the embedding
         """
         try:
-            response = await self.client.embeddings.create(
-                input=text,
-                model=self.deployment
-            )
+            response = await self._create_embeddings(text)
             return response.data[0].embedding
         except Exception as e:
             raise Exception(f"Error generating embedding: {str(e)}")
 
-    async def get_batch_embeddings(self, texts: List[str], retry_count: int = 0, max_retries: int = 8) -> List[List[float]]:
+    async def get_batch_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generate embeddings for multiple texts
+
+        Texts are packed into requests of at most max_inputs texts and about
+        max_tokens tokens, and up to max_concurrency requests run at once.
+
+        Args:
+            texts: List of texts to embed
+
+        Returns:
+            List of embeddings (each embedding is a list of floats), in input order
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def embed_chunk(chunk):
+            async with semaphore:
+                return await self._get_chunk_embeddings(chunk)
+
+        results = await asyncio.gather(*(embed_chunk(chunk) for chunk in self._chunk_texts(texts)))
+        return [embedding for chunk_embeddings in results for embedding in chunk_embeddings]
+
+    def _chunk_texts(self, texts: List[str]) -> List[List[str]]:
+        """Split texts into request-sized chunks, preserving order"""
+        chunks = []
+        chunk = []
+        chunk_tokens = 0
+        for text in texts:
+            # ~4 characters per token for English/JSON text (no tokenizer dependency)
+            tokens = len(text) // 4 + 1
+            if chunk and (len(chunk) >= self.max_inputs or chunk_tokens + tokens > self.max_tokens):
+                chunks.append(chunk)
+                chunk = []
+                chunk_tokens = 0
+            chunk.append(text)
+            chunk_tokens += tokens
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    async def _create_embeddings(self, input):
+        """
+        Call the embeddings API, retrying transient failures with exponential
+        backoff and full jitter (or the server's Retry-After, when it sends one)
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self.client.embeddings.create(
+                    input=input,
+                    model=self.deployment,
+                    **self._create_kwargs
+                )
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                wait_time = _retry_after_seconds(e)
+                if wait_time is None:
+                    wait_time = random.uniform(0, min(30.0, 0.5 * 2 ** attempt))
+                print(f"[Embedding] {e.__class__.__name__}. Retry {attempt + 1}/{self.max_retries} after {wait_time:.1f}s. Error: {str(e)[:200]}")
+                await asyncio.sleep(wait_time)
+
+    async def _get_chunk_embeddings(self, texts: List[str]) -> List[List[float]]:
         """
-        Generate embeddings for multiple texts in a single request with retry logic
+        Generate embeddings for one chunk of texts in a single request
 
         Args:
             texts: List of texts to embed
-            retry_count: Current retry attempt (for internal use)
-            max_retries: Maximum number of retries for rate limit errors
 
         Returns:
             List of embeddings (each embedding is a list of floats)
         """
         try:
             # Azure OpenAI can handle batch inputs
-            response = await self.client.embeddings.create(
-                input=texts,
-                model=self.deployment
-            )
+            response = await self._create_embeddings(texts)
             return [data.embedding for data in response.data]
+        except RateLimitError as e:
+            print(f"[Embedding] Max retries ({self.max_retries}) reached for rate limit. Failing batch.")
+            raise Exception(f"Rate limit exceeded after {self.max_retries} retries: {e}")
         except Exception as e:
             error_msg = str(e)
 
-            # Check if error is due to rate limit (429)
-            if "429" in error_msg or "RateLimitReached" in error_msg or "rate limit" in error_msg.lower():
-                if retry_count < max_retries:
-                    # Exponential backoff: 2, 4, 8, 16, 32 seconds
-                    wait_time = 2 ** (retry_count + 1)
-                    print(f"[Embedding] Rate limit hit. Retry {retry_count + 1}/{max_retries} after {wait_time}s. Error: {error_msg[:200]}")
-                    await asyncio.sleep(wait_time)
-                    return await self.get_batch_embeddings(texts, retry_count + 1, max_retries)
-                else:
-                    print(f"[Embedding] Max retries ({max_retries}) reached for rate limit. Failing batch.")
-                    raise Exception(f"Rate limit exceeded after {max_retries} retries: {error_msg}")
-
             # Check if error is due to token limit
             if "maximum context length" in error_msg or "token" in error_msg.lower():
                 # If batch is too large, split it and retry
                 if len(texts) > 1:
                     print(f"[Embedding] Batch too large ({len(texts)} items), splitting in half and retrying...")
                     mid = len(texts) // 2
-                    first_half = await self.get_batch_embeddings(texts[:mid])
-                    second_half = await self.get_batch_embeddings(texts[mid:])
+                    first_half = await self._get_chunk_embeddings(texts[:mid])
+                    second_half = await self._get_chunk_embeddings(texts[mid:])
                     return first_half + second_half
                 else:
                     # Single item is too large - return zero embedding
                     print(f"[Embedding] Single item too large, returning zero embedding. Error: {error_msg}")
-                    return [[0.0] * 1536]  # Return zero embedding for oversized item
+                    return [[0.0] * (self.dimensions or 1536)]  # Return zero embedding for oversized item
+
+            raise Exception(f"Error generating batch embeddings: {error_msg}")
+
 
-            raise Exception(f"Error generating batch embeddings: {error_msg}")
\ No newline at end of file
+def _retry_after_seconds(error) -> Optional[float]:
+    """Seconds the server asked us to wait (Retry-After header), if any"""
+    if not isinstance(error, APIStatusError):
+        return None
+    retry_after = error.response.headers.get('retry-after')
+    try:
+        return min(float(retry_after), 60.0) if retry_after else None
+    except ValueError:
+        return None
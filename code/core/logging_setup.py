@@ -0,0 +1,34 @@
+"""
+Logging configuration shared by the master and worker processes.
+
+Records are handed to a QueueHandler and written to stderr by a
+QueueListener thread, so request/scheduler threads never block on
+console I/O. Level comes from LOG_LEVEL (default INFO).
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+
+_listener = None
+
+
+def configure_logging():
+    """Install the queue-backed root handler (safe to call more than once)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+
+    root = logging.getLogger()
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
@@ -1,9 +1,22 @@
+import atexit
 import requests
+from requests.adapters import HTTPAdapter
+import urllib3.exceptions
+from urllib3.util.retry import Retry
 from urllib.parse import urljoin, urlparse
+import io
 import os
-import json
+import orjson
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-import xml.etree.ElementTree as ET
+from queue import Queue, Empty
+try:
+    from lxml import etree as ET  # libxml2 parser: faster, far smaller per-element footprint
+except ImportError:
+    import xml.etree.ElementTree as ET
 import config  # Load environment variables
 import db
 from queue_interface_aad import get_queue_with_aad as get_queue
@@ -11,60 +24,139 @@ from queue_interface_aad import get_queue_with_aad as get_queue
 # Queue history log file
 QUEUE_LOG_FILE = '/app/data/queue_history.jsonl'
 
+# One buffered append handle for the life of the process (opened on first use)
+# instead of an open/write/close per queue operation
+_queue_log_fh = None
+_queue_log_lock = threading.Lock()
+
+def _get_queue_log_fh():
+    """Open the queue history log for appending, once"""
+    global _queue_log_fh
+    if _queue_log_fh is None:
+        with _queue_log_lock:
+            if _queue_log_fh is None:
+                os.makedirs(os.path.dirname(QUEUE_LOG_FILE), exist_ok=True)
+                # Closed by _stop_job_sender, after the final jobs are logged
+                _queue_log_fh = open(QUEUE_LOG_FILE, 'ab', buffering=64 * 1024)
+    return _queue_log_fh
+
 def log_queue_operation(operation_type, job_data, success=True, error=None):
-    """Log queue operations to a local JSONL file"""
+    """Log queue operations to a local JSONL file (buffered; failures are flushed at once)"""
     try:
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(QUEUE_LOG_FILE), exist_ok=True)
-
         log_entry = {
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': datetime.utcnow(),  # orjson writes datetimes as ISO 8601 itself
             'operation': operation_type,
             'job': job_data,
             'success': success,
             'error': str(error) if error else None
         }
 
-        with open(QUEUE_LOG_FILE, 'a') as f:
-            f.write(json.dumps(log_entry) + '\n')
+        fh = _get_queue_log_fh()
+        fh.write(orjson.dumps(log_entry, default=str) + b'\n')
+        if not success:
+            fh.flush()
     except Exception as e:
         print(f"[MASTER] Error logging queue operation: {e}")
 
-def parse_schema_map_xml(xml_content, base_url):
-    """Parse schema_map.xml content and extract schema.org file URLs"""
+def flush_queue_log():
+    """Make buffered queue history visible to readers (e.g. the /api/logs endpoints)"""
     try:
-        root = ET.fromstring(xml_content)
-
-        # Handle namespace if present
-        namespace = {'sitemap': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
+        if _queue_log_fh is not None:
+            _queue_log_fh.flush()
+    except Exception as e:
+        print(f"[MASTER] Error flushing queue log: {e}")
+
+# Schema maps of one site downloaded at once (the DB update is one call per site)
+SCHEMA_MAP_WORKERS = 8
+
+# Shared session for robots.txt/schema map fetches: connections (and TLS sessions)
+# to a host are kept alive and reused across requests and sites. Transient 5xx
+# responses and read errors are retried with a short backoff; refused/unresolvable
+# hosts fail at once, and a final 5xx is returned (not raised) like any non-200.
+_http_session = requests.Session()
+_http_adapter = HTTPAdapter(
+    pool_connections=16, pool_maxsize=32,
+    max_retries=Retry(total=3, connect=0, backoff_factor=0.3,
+                      status_forcelist=[500, 502, 503, 504], raise_on_status=False)
+)
+_http_session.mount('http://', _http_adapter)
+_http_session.mount('https://', _http_adapter)
+
+SITEMAP_NS = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+# <url> tag -> the <loc> tag to look up inside it (namespaced and bare sitemaps)
+SITEMAP_LOC_TAGS = {SITEMAP_NS + 'url': SITEMAP_NS + 'loc', 'url': 'loc'}
+_LXML = hasattr(ET, 'LXML_VERSION')
+# Schema map URLs come from users: never let lxml expand external entities (local
+# files) or fetch DTDs over the network. The stdlib parser never does either.
+_ITERPARSE_OPTIONS = {'resolve_entities': False, 'no_network': True, 'huge_tree': False} if _LXML else {}
+
+# schemaMap directives in robots.txt, matched in one pass over the raw body bytes
+SCHEMAMAP_RE = re.compile(rb'^[ \t]*schemamap[ \t]*:[ \t]*(\S+)', re.IGNORECASE | re.MULTILINE)
+
+def _resolve_url(base_url, url):
+    """urljoin(base_url, url), skipping it for absolute URLs with no dot segments to normalize"""
+    # Most maps list absolute URLs, and urljoin is most of the per-entry parse cost
+    if url.startswith(('https://', 'http://')) and '/.' not in url:
+        return url
+    return urljoin(base_url, url)
 
-        schema_urls = []
+def parse_schema_map_xml(xml_content, base_url):
+    """
+    Parse schema_map.xml content (bytes, str, or a binary file object such as
+    a streamed response's .raw) and extract schema.org file URLs
+    """
+    if isinstance(xml_content, str):
+        xml_content = xml_content.encode('utf-8')
+    if isinstance(xml_content, bytes):
+        xml_content = io.BytesIO(xml_content)
 
-        # Try with namespace first
-        urls = root.findall('sitemap:url', namespace)
-        if not urls:
-            # Try without namespace
-            urls = root.findall('url')
+    schema_urls = []
+    try:
+        # Stream the document and clear each <url> once read, rather than
+        # building the whole tree
+        for _, elem in ET.iterparse(xml_content, events=('end',), **_ITERPARSE_OPTIONS):
+            loc_tag = SITEMAP_LOC_TAGS.get(elem.tag)
+            if loc_tag is None:
+                continue
 
-        for url_elem in urls:
             # Check if this URL has structuredData/schema.org content type
-            content_type = url_elem.get('contentType', '')
-            if 'schema.org' in content_type.lower():
-                # Get the location
-                loc = url_elem.find('sitemap:loc', namespace)
-                if loc is None:
-                    loc = url_elem.find('loc')
-
+            if 'schema.org' in elem.get('contentType', '').lower():
+                loc = elem.find(loc_tag)
                 if loc is not None and loc.text:
                     # Make URL absolute if needed
-                    url = urljoin(base_url, loc.text.strip())
-                    schema_urls.append(url)
+                    schema_urls.append(_resolve_url(base_url, loc.text.strip()))
+
+            elem.clear()
+            # lxml keeps cleared elements attached to the root; drop the processed ones
+            if _LXML:
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
 
         return schema_urls
     except ET.ParseError as e:
         print(f"Error parsing XML: {e}")
         return []
 
+def fetch_schema_map(map_url, base_url):
+    """
+    Fetch a schema map and parse it while it downloads.
+    Returns (status_code, schema file URLs); URLs are empty unless the status is 200.
+    """
+    with _http_session.get(map_url, timeout=10, stream=True) as response:
+        if response.status_code != 200:
+            return response.status_code, []
+        response.raw.decode_content = True  # Undo gzip/deflate transfer encoding
+        try:
+            return response.status_code, parse_schema_map_xml(response.raw, base_url)
+        except urllib3.exceptions.HTTPError as e:
+            # Reading .raw directly skips requests' own wrapping of mid-download
+            # failures, so map them the way iter_content() would for our callers
+            if isinstance(e, urllib3.exceptions.ReadTimeoutError):
+                raise requests.exceptions.ConnectionError(e) from e
+            if isinstance(e, urllib3.exceptions.DecodeError):
+                raise requests.exceptions.ContentDecodingError(e) from e
+            raise requests.exceptions.ChunkedEncodingError(e) from e
+
 def get_schema_urls_from_robots(site_url):
     """
     Fetch robots.txt or schema_map.xml and extract schema file URLs.
@@ -76,26 +168,31 @@ def get_schema_urls_from_robots(site_url):
     # First, try robots.txt
     robots_url = urljoin(site_url, '/robots.txt')
     try:
-        response = requests.get(robots_url, timeout=10)
+        response = _http_session.get(robots_url, timeout=10)
         if response.status_code == 200:
-            schema_map_urls = []
-            for line in response.text.splitlines():
-                if line.lower().startswith('schemamap:'):
-                    url = line.split(':', 1)[1].strip()
-                    schema_map_urls.append(urljoin(site_url, url))
+            # Scan response.content rather than .text: no decode (or charset
+            # detection) of the whole file, only the matched URLs
+            schema_map_urls = [
+                urljoin(site_url, m.group(1).decode('utf-8', 'replace'))
+                for m in SCHEMAMAP_RE.finditer(response.content)
+            ]
 
             # If we found schemaMap directives, fetch and parse those XML files
             if schema_map_urls:
-                all_schema_files = []
-                for map_url in schema_map_urls:
+                def fetch(map_url):
                     try:
-                        map_response = requests.get(map_url, timeout=10)
-                        if map_response.status_code == 200:
-                            json_urls = parse_schema_map_xml(map_response.text, site_url)
-                            # Return triples of (site_url, schema_map_url, json_file_url)
-                            all_schema_files.extend([(site_url, map_url, json_url) for json_url in json_urls])
+                        return fetch_schema_map(map_url, site_url)[1]
                     except requests.RequestException as e:
                         print(f"Error fetching schema map from {map_url}: {e}")
+                        return []
+
+                # Fetch the maps concurrently; map() keeps results in directive order
+                with ThreadPoolExecutor(max_workers=min(SCHEMA_MAP_WORKERS, len(schema_map_urls))) as executor:
+                    results = executor.map(fetch, schema_map_urls)
+                    all_schema_files = []
+                    for map_url, json_urls in zip(schema_map_urls, results):
+                        # Return triples of (site_url, schema_map_url, json_file_url)
+                        all_schema_files.extend([(site_url, map_url, json_url) for json_url in json_urls])
                 return all_schema_files
     except requests.RequestException:
         pass  # Try schema_map.xml next
@@ -103,9 +200,8 @@ def get_schema_urls_from_robots(site_url):
     # If no robots.txt or no schemaMap directives, try schema_map.xml directly
     schema_map_url = urljoin(site_url + '/', 'schema_map.xml')
     try:
-        response = requests.get(schema_map_url, timeout=10)
-        if response.status_code == 200:
-            json_urls = parse_schema_map_xml(response.text, site_url)
+        status_code, json_urls = fetch_schema_map(schema_map_url, site_url)
+        if status_code == 200:
             # Return triples of (site_url, schema_map_url, json_file_url)
             return [(site_url, schema_map_url, json_url) for json_url in json_urls]
     except requests.RequestException:
@@ -114,10 +210,9 @@ def get_schema_urls_from_robots(site_url):
     # As a last resort, if the site_url itself ends with schema_map.xml, fetch it
     if site_url.endswith('schema_map.xml'):
         try:
-            response = requests.get(site_url, timeout=10)
-            if response.status_code == 200:
-                base = site_url.rsplit('/', 1)[0] + '/'
-                json_urls = parse_schema_map_xml(response.text, base)
+            base = site_url.rsplit('/', 1)[0] + '/'
+            status_code, json_urls = fetch_schema_map(site_url, base)
+            if status_code == 200:
                 # Return triples of (site_url, schema_map_url, json_file_url)
                 return [(site_url, site_url, json_url) for json_url in json_urls]
         except requests.RequestException as e:
@@ -126,123 +221,221 @@ def get_schema_urls_from_robots(site_url):
     print(f"No schema files found for {site_url}")
     return []
 
-def add_schema_map_to_site(site_url, user_id, schema_map_url):
+def add_schema_map_to_site(site_url, user_id, schema_map_url, json_file_urls=None):
     """
     Add a schema map to a site (Level 2 logic):
-    1. Fetch and parse the schema_map XML
+    1. Fetch and parse the schema_map XML (skipped when json_file_urls are given)
     2. Add all JSON files to database
     3. Queue all files for processing
     Returns: (files_added_count, files_queued_count)
     """
-    conn = None
     try:
-        conn = db.get_connection()
+        # Fetch and parse the schema_map before borrowing a DB connection, so the
+        # pooled connection is only held for the site check and the file update
+        if json_file_urls is None:
+            status_code, json_file_urls = fetch_schema_map(schema_map_url, site_url)
+            if status_code != 200:
+                print(f"[MASTER] Failed to fetch schema_map {schema_map_url}: HTTP {status_code}")
+                return (0, 0)
+
+        if not json_file_urls:
+            print(f"[MASTER] No schema files found in {schema_map_url}")
+            return (0, 0)
+
+        # Create triples: (site_url, schema_map_url, json_file_url), once per
+        # file even if the map lists it more than once
+        files_to_add = [(site_url, schema_map_url, json_url) for json_url in dict.fromkeys(json_file_urls)]
+        return sync_site_files(site_url, user_id, files_to_add)
+
+    except Exception as e:
+        print(f"[MASTER] Error adding schema map {schema_map_url} to site {site_url}: {e}")
+        return (0, 0)
 
+def sync_site_files(site_url, user_id, files_to_add):
+    """
+    Make files_to_add - triples of (site_url, schema_map_url, json_file_url) -
+    the site's active files, and queue jobs for the files that were added or
+    removed. Returns: (files_added_count, files_queued_count)
+    """
+    with db.connection() as conn:
         # Check if site exists, if not create it
         cursor = conn.cursor()
         cursor.execute("SELECT site_url FROM sites WHERE site_url = %s AND user_id = %s", (site_url, user_id))
         if not cursor.fetchone():
             db.add_site(conn, site_url, user_id)
 
-        # Fetch and parse the schema_map to get all JSON file URLs
-        response = requests.get(schema_map_url, timeout=10)
-        if response.status_code != 200:
-            print(f"[MASTER] Failed to fetch schema_map {schema_map_url}: HTTP {response.status_code}")
-            return (0, 0)
-
-        json_file_urls = parse_schema_map_xml(response.text, site_url)
-
-        if not json_file_urls:
-            print(f"[MASTER] No schema files found in {schema_map_url}")
-            return (0, 0)
-
-        # Create triples: (site_url, schema_map_url, json_file_url)
-        files_to_add = [(site_url, schema_map_url, json_url) for json_url in json_file_urls]
-
         # Add all files to the database
         added_files, removed_files = db.update_site_files(conn, site_url, user_id, files_to_add)
 
-        # Queue jobs for NEW files only
-        queue = get_queue()
-        queued_count = 0
-
-        for file_url in added_files:
+    # Hand jobs for NEW and REMOVED files to the background sender, which
+    # batches them with other maps' and sites' jobs; only the count of process
+    # jobs actually sent is waited for
+    schema_maps = {file_url: schema_map_url for _, schema_map_url, file_url in files_to_add}
+    queued_at = datetime.utcnow().isoformat()
+    add_sent = enqueue_jobs([
+        ('queue_file', {
+            'type': 'process_file',
+            'user_id': user_id,  # Add user_id to job
+            'site': site_url,
+            'file_url': file_url,
+            'schema_map': schema_maps[file_url],
+            'queued_at': queued_at
+        })
+        for file_url in added_files
+    ])
+    enqueue_jobs([
+        ('queue_removed_file', {
+            'type': 'process_removed_file',
+            'user_id': user_id,  # Add user_id to job
+            'site': site_url,
+            'file_url': file_url,
+            'queued_at': queued_at
+        })
+        for file_url in removed_files
+    ])
+
+    return (len(added_files), add_sent.result())
+
+# Jobs are sent by one background thread that collects them for up to
+# JOB_FLUSH_INTERVAL seconds (or JOB_BATCH_SIZE jobs) per send_message_batch,
+# batching across schema maps and sites and reusing one queue client
+JOB_BATCH_SIZE = int(os.getenv('JOB_BATCH_SIZE', '100'))
+JOB_FLUSH_INTERVAL = float(os.getenv('JOB_FLUSH_INTERVAL', '0.05'))
+_job_queue = Queue()  # (entries, future) groups, or None to stop
+_job_sender = None
+_job_sender_lock = threading.Lock()
+
+def enqueue_jobs(entries):
+    """
+    Queue (operation_type, job) entries for the background sender.
+    Returns a Future resolving to how many of them were sent (entries[:n] went out).
+    """
+    future = Future()
+    if not entries:
+        future.set_result(0)
+        return future
+    _start_job_sender()
+    _job_queue.put((entries, future))
+    return future
+
+def _start_job_sender():
+    """Start the job sender thread on first use"""
+    global _job_sender
+    if _job_sender is not None:
+        return
+    with _job_sender_lock:
+        if _job_sender is None:
+            _job_sender = threading.Thread(target=_job_sender_loop, name='master-job-sender', daemon=True)
+            _job_sender.start()
+            atexit.register(_stop_job_sender)
+
+def _job_sender_loop():
+    """Collect queued jobs for up to JOB_FLUSH_INTERVAL (or JOB_BATCH_SIZE jobs) and send them"""
+    queue = None
+    stopping = False
+    while not stopping:
+        group = _job_queue.get()
+        if group is None:
+            break
+        groups = [group]
+        count = len(group[0])
+        deadline = time.monotonic() + JOB_FLUSH_INTERVAL
+        while count < JOB_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
             try:
-                job = {
-                    'type': 'process_file',
-                    'user_id': user_id,  # Add user_id to job
-                    'site': site_url,
-                    'file_url': file_url,
-                    'schema_map': schema_map_url,
-                    'queued_at': datetime.utcnow().isoformat()
-                }
-                success = queue.send_message(job)
-                if success:
-                    log_queue_operation('queue_file', job, success=True)
-                    queued_count += 1
-                else:
-                    log_queue_operation('queue_file', job, success=False, error="send_message returned False")
-            except Exception as e:
-                log_queue_operation('queue_file', job, success=False, error=e)
-
-        # Queue jobs for REMOVED files
-        for file_url in removed_files:
+                group = _job_queue.get(timeout=remaining)
+            except Empty:
+                break
+            if group is None:
+                stopping = True
+                break
+            groups.append(group)
+            count += len(group[0])
+
+        entries = [entry for group_entries, _ in groups for entry in group_entries]
+        sent = 0
+        try:
+            if queue is None:
+                queue = get_queue()
+            sent = _send_jobs(queue, entries)
+        except Exception as e:
+            print(f"[MASTER] Error sending {len(entries)} jobs: {e}")
+            for operation_type, job in entries:
+                log_queue_operation(operation_type, job, success=False, error=e)
+        flush_queue_log()
+
+        # Sends stop at the first failure, so each group got the part of the sent prefix it covers
+        offset = 0
+        for group_entries, future in groups:
+            future.set_result(max(0, min(len(group_entries), sent - offset)))
+            offset += len(group_entries)
+
+    if queue is not None:
+        queue.close()
+
+def _stop_job_sender():
+    """Send queued jobs, then close the queue client and the queue history log, at interpreter exit"""
+    global _queue_log_fh
+    _job_queue.put(None)
+    _job_sender.join(timeout=30)
+    if _job_sender.is_alive():
+        # Still sending; leave the handle open for it, but make what's logged so far visible
+        flush_queue_log()
+        return
+    with _queue_log_lock:
+        if _queue_log_fh is not None:
             try:
-                job = {
-                    'type': 'process_removed_file',
-                    'user_id': user_id,  # Add user_id to job
-                    'site': site_url,
-                    'file_url': file_url,
-                    'queued_at': datetime.utcnow().isoformat()
-                }
-                success = queue.send_message(job)
-                if success:
-                    log_queue_operation('queue_removed_file', job, success=True)
-                else:
-                    log_queue_operation('queue_removed_file', job, success=False, error="send_message returned False")
+                _queue_log_fh.close()
             except Exception as e:
-                log_queue_operation('queue_removed_file', job, success=False, error=e)
-
-        return (len(added_files), queued_count)
+                print(f"[MASTER] Error closing queue log: {e}")
+            _queue_log_fh = None
 
+def _send_jobs(queue, entries):
+    """Send (operation_type, job) entries as one batch and log each one's outcome, returns how many were sent"""
+    if not entries:
+        return 0
+    try:
+        sent = queue.send_message_batch([job for _, job in entries])
+        error = "send_message_batch stopped before this job"
     except Exception as e:
-        print(f"[MASTER] Error adding schema map {schema_map_url} to site {site_url}: {e}")
-        return (0, 0)
-    finally:
-        if conn:
-            try:
-                conn.close()
-            except:
-                pass
+        sent, error = 0, e
+    for i, (operation_type, job) in enumerate(entries):
+        if i < sent:
+            log_queue_operation(operation_type, job, success=True)
+        else:
+            log_queue_operation(operation_type, job, success=False, error=error)
+    return sent
 
 def process_site(site_url, user_id):
     """
     Process a site (Level 1 logic):
     1. Discover schema maps from robots.txt
-    2. For each schema map, call add_schema_map_to_site (Level 2)
+    2. Make the files of all its maps the site's active files and queue them
     """
     try:
         # Get schema map URLs from robots.txt
-        # This returns triples, but we only need the unique schema_map URLs
+        # This returns triples of (site_url, schema_map_url, json_file_url)
         triples = get_schema_urls_from_robots(site_url)
 
-        # Extract unique schema_map URLs
-        schema_map_urls = list(set(schema_map for _, schema_map, _ in triples))
+        # Syncing replaces the site's whole file list, so all maps' files go up
+        # together in one update (per-map updates would each deactivate the
+        # other maps' files). A file listed by several maps keeps its first map.
+        files_by_url = {}
+        for _, schema_map, json_url in triples:
+            files_by_url.setdefault(json_url, (site_url, schema_map, json_url))
+        schema_map_urls = list(dict.fromkeys(schema_map for _, schema_map, _ in triples))
 
         if not schema_map_urls:
             print(f"[MASTER] No schema maps found for {site_url}")
             return False
 
         print(f"[MASTER] Found {len(schema_map_urls)} schema map(s) for {site_url}")
-
-        # For each discovered schema map, use Level 2 logic to add it
-        total_files = 0
-        total_queued = 0
         for schema_map_url in schema_map_urls:
             print(f"[MASTER] Adding schema map: {schema_map_url}")
-            files_added, files_queued = add_schema_map_to_site(site_url, user_id, schema_map_url)
-            total_files += files_added
-            total_queued += files_queued
+
+        total_files, total_queued = sync_site_files(site_url, user_id, list(files_by_url.values()))
 
         print(f"[MASTER] Processed {site_url}: {total_files} files added, {total_queued} queued")
         return True
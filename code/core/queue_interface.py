@@ -4,9 +4,32 @@ Queue abstraction layer that supports multiple backends
 import config  # Load environment variables
 import os
 import json
+import orjson
 import abc
-from datetime import datetime
-from typing import Optional, Dict, Any, Callable
+import fcntl
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, Callable, List
+
+# One DefaultAzureCredential per process: each new one walks the credential
+# chain again and starts with an empty token cache
+_azure_credential = None
+_azure_credential_lock = threading.Lock()
+
+
+def get_azure_credential():
+    """Get the process-wide DefaultAzureCredential, creating it on first use"""
+    global _azure_credential
+    if _azure_credential is None:
+        with _azure_credential_lock:
+            if _azure_credential is None:
+                from azure.identity import DefaultAzureCredential
+                _azure_credential = DefaultAzureCredential(exclude_shared_token_cache_credential=True)
+    return _azure_credential
 
 
 class QueueMessage:
@@ -25,11 +48,27 @@ class QueueInterface(abc.ABC):
         """Send a message to the queue"""
         pass
 
+    def send_message_batch(self, messages: List[Dict[Any, Any]]) -> int:
+        """
+        Send messages in order, stopping at the first failure. Returns how many
+        were sent, i.e. messages[:n] went out (backends override to batch round-trips)
+        """
+        sent = 0
+        for message in messages:
+            if not self.send_message(message):
+                break
+            sent += 1
+        return sent
+
     @abc.abstractmethod
     def receive_message(self, visibility_timeout: int = 300) -> Optional[QueueMessage]:
         """Receive a message from the queue"""
         pass
 
+    def close(self):
+        """Release any connections held by the backend (owners call this when done)"""
+        pass
+
     @abc.abstractmethod
     def delete_message(self, message: QueueMessage) -> bool:
         """Delete a message from the queue"""
@@ -44,42 +83,146 @@ class QueueInterface(abc.ABC):
 class FileQueue(QueueInterface):
     """File-based queue implementation for local development"""
 
+    COUNTERS_FILE = '_counters.json'
+    COUNTERS_LOCK_FILE = '_counters.lock'
+    # The counters are adjusted after each job file moves, so a process that dies
+    # between the two leaves them off by one until they are next recounted from
+    # disk; get_counts() recounts once they are older than this many seconds.
+    COUNTERS_RECONCILE_SECONDS = int(os.getenv('FILE_QUEUE_RECONCILE_SECONDS', '300'))
+    SCAN_BATCH_SIZE = 1000  # Oldest pending job names buffered per directory scan
+
     def __init__(self, queue_dir: str = 'queue'):
         self.queue_dir = queue_dir
         os.makedirs(queue_dir, exist_ok=True)
+        self._counters_path = os.path.join(queue_dir, self.COUNTERS_FILE)
+        self._lock_path = os.path.join(queue_dir, self.COUNTERS_LOCK_FILE)
+        self._pending_names = deque()  # Next job files to try claiming, oldest first
+
+    def _count_files(self) -> Dict[str, int]:
+        """Count pending/processing jobs by scanning the queue directory"""
+        counts = {'pending': 0, 'processing': 0}
+        with os.scandir(self.queue_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith('job-') and entry.name.endswith('.json'):
+                    counts['pending'] += 1
+                elif entry.name.endswith('.processing'):
+                    counts['processing'] += 1
+        return counts
+
+    def _rebuild_counters(self) -> Dict[str, int]:
+        """Recount from disk and persist the result (call with the counters lock held)"""
+        counts = self._count_files()
+        self._write_counters({**counts, 'reconciled_at': time.time()})
+        return counts
+
+    def _write_counters(self, counts: Dict[str, int]):
+        temp_path = self._counters_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(counts, f)
+        os.replace(temp_path, self._counters_path)
+
+    def _update_counters(self, pending: int = 0, processing: int = 0):
+        """Adjust the persistent queue-depth counters after a job file moved"""
+        try:
+            with open(self._lock_path, 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    with open(self._counters_path) as f:
+                        counts = json.load(f)
+                    counts['pending'] = max(0, counts['pending'] + pending)
+                    counts['processing'] = max(0, counts['processing'] + processing)
+                except (OSError, ValueError, KeyError):
+                    # Missing or corrupt - rebuild from disk (already reflects this change)
+                    self._rebuild_counters()
+                    return
+                self._write_counters(counts)
+        except Exception as e:
+            print(f"[FileQueue] Error updating counters: {e}")
+
+    def get_counts(self) -> Dict[str, int]:
+        """
+        Get pending/processing job counts from the persistent counters, only
+        scanning the directory when they are missing or due for reconciling
+        """
+        try:
+            with open(self._counters_path) as f:
+                counts = json.load(f)
+            if time.time() - counts.get('reconciled_at', 0) < self.COUNTERS_RECONCILE_SECONDS:
+                return {'pending': counts['pending'], 'processing': counts['processing']}
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+        with open(self._lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            return self._rebuild_counters()
+
+    # Per-process sequence appended to job IDs, so jobs written in the same
+    # microsecond (e.g. by send_message_batch) don't overwrite each other
+    _job_seq = itertools.count()
+
+    def _write_job(self, message: Dict[Any, Any]):
+        """Write one job file atomically (temp file, then rename into place)"""
+        job_id = f"job-{datetime.utcnow().strftime('%Y%m%d-%H%M%S-%f')}-{os.getpid()}-{next(self._job_seq):08d}.json"
+        temp_path = os.path.join(self.queue_dir, f".tmp-{job_id}")
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, orjson.dumps(message))
+        finally:
+            os.close(fd)
+        os.replace(temp_path, os.path.join(self.queue_dir, job_id))  # Atomic write
 
     def send_message(self, message: Dict[Any, Any]) -> bool:
         """Write a job file to the queue directory"""
         try:
-            job_id = f"job-{datetime.utcnow().strftime('%Y%m%d-%H%M%S-%f')}.json"
-            temp_path = os.path.join(self.queue_dir, f".tmp-{job_id}")
-            final_path = os.path.join(self.queue_dir, job_id)
-
-            with open(temp_path, 'w') as f:
-                json.dump(message, f)
-            os.rename(temp_path, final_path)  # Atomic write
+            self._write_job(message)
+            self._update_counters(pending=1)
             return True
         except Exception as e:
             print(f"[FileQueue] Error sending message: {e}")
             return False
 
+    def send_message_batch(self, messages: List[Dict[Any, Any]]) -> int:
+        """Write job files in order, stopping at the first failure, with one counters update"""
+        sent = 0
+        try:
+            for message in messages:
+                self._write_job(message)
+                sent += 1
+        except Exception as e:
+            print(f"[FileQueue] Error sending message batch ({sent}/{len(messages)} sent): {e}")
+        if sent:
+            self._update_counters(pending=sent)
+        return sent
+
+    def _scan_pending_names(self) -> List[str]:
+        """Names of the oldest pending job files (job IDs sort by creation time)"""
+        with os.scandir(self.queue_dir) as entries:
+            names = (entry.name for entry in entries
+                     if entry.name.startswith('job-') and entry.name.endswith('.json'))
+            return heapq.nsmallest(self.SCAN_BATCH_SIZE, names)
+
     def receive_message(self, visibility_timeout: int = 300) -> Optional[QueueMessage]:
         """Claim a job from the file system"""
         try:
-            for filename in sorted(os.listdir(self.queue_dir)):
-                if not filename.startswith('job-') or not filename.endswith('.json'):
-                    continue
+            # Claim from the buffered names and only rescan the directory once
+            # they run out, instead of listing and sorting it on every receive
+            while True:
+                if not self._pending_names:
+                    self._pending_names.extend(self._scan_pending_names())
+                    if not self._pending_names:
+                        return None
+                filename = self._pending_names.popleft()
 
                 job_path = os.path.join(self.queue_dir, filename)
                 processing_path = job_path + '.processing'
 
                 try:
-                    # Atomic claim via rename
+                    # Atomic claim via rename; fails if another worker got it first
                     os.rename(job_path, processing_path)
+                    self._update_counters(pending=-1, processing=1)
 
                     # Read job
-                    with open(processing_path) as f:
-                        content = json.load(f)
+                    with open(processing_path, 'rb') as f:
+                        content = orjson.loads(f.read())
 
                     return QueueMessage(
                         id=filename,
@@ -98,6 +241,7 @@ class FileQueue(QueueInterface):
         try:
             if os.path.exists(message.receipt_handle):
                 os.remove(message.receipt_handle)
+                self._update_counters(processing=-1)
             return True
         except Exception as e:
             print(f"[FileQueue] Error deleting message: {e}")
@@ -109,6 +253,7 @@ class FileQueue(QueueInterface):
             if os.path.exists(message.receipt_handle):
                 original_path = message.receipt_handle.replace('.processing', '')
                 os.rename(message.receipt_handle, original_path)
+                self._update_counters(pending=1, processing=-1)
             return True
         except Exception as e:
             print(f"[FileQueue] Error returning message: {e}")
@@ -116,13 +261,34 @@ class FileQueue(QueueInterface):
 
 
 class AzureServiceBusQueue(QueueInterface):
-    """Azure Service Bus queue implementation"""
+    """
+    Azure Service Bus queue implementation. Subclasses that authenticate
+    differently override __init__ and _get_client only.
+    """
+
+    LOG_PREFIX = '[ServiceBus]'
+
+    # Messages pulled per receive round-trip and buffered locally, and how many the
+    # link prefetches. The worker runs one job at a time and jobs can take minutes,
+    # while buffered and prefetched messages sit locked without renewal, so both
+    # default to no read-ahead. Raise them only for consumers with short jobs.
+    RECEIVE_BATCH_SIZE = int(os.getenv('SB_RECEIVE_BATCH', '1'))
+    PREFETCH_COUNT = int(os.getenv('SB_PREFETCH', '0'))
+    # Buffered messages whose lock ends within this margin are left to be redelivered
+    LOCK_SAFETY_MARGIN = timedelta(seconds=int(os.getenv('SB_LOCK_MARGIN', '10')))
 
     def __init__(self, connection_string: str, queue_name: str = 'jobs'):
         from azure.servicebus import ServiceBusClient
         self.connection_string = connection_string
         self.queue_name = queue_name
         self._client = None
+        # One long-lived sender and receiver link per instance, opened on first use
+        # (links aren't thread-safe, so each is used under its own lock)
+        self._sender = None
+        self._receiver = None
+        self._buffer = deque()  # Received, not yet handed out
+        self._sender_lock = threading.Lock()
+        self._receiver_lock = threading.Lock()
 
     def _get_client(self):
         if not self._client:
@@ -130,60 +296,126 @@ class AzureServiceBusQueue(QueueInterface):
             self._client = ServiceBusClient.from_connection_string(self.connection_string)
         return self._client
 
+    def _get_sender(self):
+        """Open the sender link on first use (call with _sender_lock held)"""
+        if self._sender is None:
+            self._sender = self._get_client().get_queue_sender(queue_name=self.queue_name)
+        return self._sender
+
+    def _get_receiver(self):
+        """Open the receiver link on first use (call with _receiver_lock held)"""
+        if self._receiver is None:
+            self._receiver = self._get_client().get_queue_receiver(
+                queue_name=self.queue_name, max_wait_time=5, prefetch_count=self.PREFETCH_COUNT
+            )
+        return self._receiver
+
+    def close(self):
+        """Close the cached sender, receiver and client"""
+        with self._sender_lock, self._receiver_lock:
+            # Hand buffered messages back now rather than waiting for their locks to expire
+            while self._buffer:
+                try:
+                    self._receiver.abandon_message(self._buffer.popleft())
+                except Exception:
+                    pass
+            for handler in (self._sender, self._receiver, self._client):
+                if handler is not None:
+                    try:
+                        handler.close()
+                    except Exception as e:
+                        print(f"{self.LOG_PREFIX} Error closing: {e}")
+            self._sender = self._receiver = self._client = None
+
     def send_message(self, message: Dict[Any, Any]) -> bool:
         """Send message to Service Bus"""
         try:
             from azure.servicebus import ServiceBusMessage
-            client = self._get_client()
-            with client.get_queue_sender(queue_name=self.queue_name) as sender:
-                sb_message = ServiceBusMessage(json.dumps(message))
-                sender.send_messages(sb_message)
+            with self._sender_lock:
+                self._get_sender().send_messages(ServiceBusMessage(orjson.dumps(message)))
             return True
         except Exception as e:
-            print(f"[ServiceBus] Error sending message: {e}")
+            print(f"{self.LOG_PREFIX} Error sending message: {e}")
             return False
 
+    def send_message_batch(self, messages: List[Dict[Any, Any]]) -> int:
+        """
+        Send messages to Service Bus over the cached sender link, packed into
+        ServiceBusMessageBatches that are sent whenever one reaches the size limit
+        """
+        sent = 0
+        if not messages:
+            return sent
+        try:
+            from azure.servicebus import ServiceBusMessage
+            from azure.servicebus.exceptions import MessageSizeExceededError
+            with self._sender_lock:
+                sender = self._get_sender()
+                batch = sender.create_message_batch()
+                for message in messages:
+                    sb_message = ServiceBusMessage(orjson.dumps(message))
+                    try:
+                        batch.add_message(sb_message)
+                    except MessageSizeExceededError:
+                        if not len(batch):
+                            raise  # Too large to send even on its own
+                        sender.send_messages(batch)
+                        sent += len(batch)
+                        batch = sender.create_message_batch()
+                        batch.add_message(sb_message)
+                if len(batch):
+                    sender.send_messages(batch)
+                    sent += len(batch)
+        except Exception as e:
+            print(f"{self.LOG_PREFIX} Error sending message batch ({sent}/{len(messages)} sent): {e}")
+        return sent
+
     def receive_message(self, visibility_timeout: int = 300) -> Optional[QueueMessage]:
-        """Receive message from Service Bus"""
+        """Receive message from Service Bus, served from a locally buffered batch"""
         try:
-            client = self._get_client()
-            with client.get_queue_receiver(
-                queue_name=self.queue_name,
-                max_wait_time=5
-            ) as receiver:
-                messages = receiver.receive_messages(max_message_count=1, max_wait_time=5)
-                if messages:
-                    msg = messages[0]
-                    content = json.loads(str(msg))
+            with self._receiver_lock:
+                while True:
+                    if not self._buffer:
+                        self._buffer.extend(self._get_receiver().receive_messages(
+                            max_message_count=self.RECEIVE_BATCH_SIZE, max_wait_time=5))
+                        if not self._buffer:
+                            return None
+                    msg = self._buffer.popleft()
+                    # Skip messages whose lock ran out (or nearly) while buffered; they'll be redelivered
+                    if msg.locked_until_utc and msg.locked_until_utc - self.LOCK_SAFETY_MARGIN <= datetime.now(timezone.utc):
+                        continue
+                    content = orjson.loads(str(msg))
                     return QueueMessage(
                         id=msg.message_id,
                         content=content,
                         receipt_handle=msg
                     )
         except Exception as e:
-            print(f"[ServiceBus] Error receiving message: {e}")
+            import traceback
+            print(f"{self.LOG_PREFIX} Error receiving message: {e}")
+            print(f"{self.LOG_PREFIX} Error details: {traceback.format_exc()}")
         return None
 
     def delete_message(self, message: QueueMessage) -> bool:
         """Complete the message in Service Bus"""
         try:
-            client = self._get_client()
-            with client.get_queue_receiver(queue_name=self.queue_name) as receiver:
-                receiver.complete_message(message.receipt_handle)
+            # Settled on the link that received it
+            with self._receiver_lock:
+                self._get_receiver().complete_message(message.receipt_handle)
             return True
         except Exception as e:
-            print(f"[ServiceBus] Error completing message: {e}")
+            print(f"{self.LOG_PREFIX} Error completing message: {e}")
             return False
 
     def return_message(self, message: QueueMessage) -> bool:
         """Abandon the message to return it to queue"""
         try:
-            client = self._get_client()
-            with client.get_queue_receiver(queue_name=self.queue_name) as receiver:
-                receiver.abandon_message(message.receipt_handle)
+            # Settled on the link that received it
+            with self._receiver_lock:
+                self._get_receiver().abandon_message(message.receipt_handle)
             return True
         except Exception as e:
-            print(f"[ServiceBus] Error abandoning message: {e}")
+            print(f"{self.LOG_PREFIX} Error abandoning message: {e}")
             return False
 
 
@@ -207,7 +439,7 @@ class AzureStorageQueue(QueueInterface):
     def send_message(self, message: Dict[Any, Any]) -> bool:
         """Send message to Storage Queue"""
         try:
-            self.queue_client.send_message(json.dumps(message))
+            self.queue_client.send_message(orjson.dumps(message).decode('utf-8'))
             return True
         except Exception as e:
             print(f"[StorageQueue] Error sending message: {e}")
@@ -221,7 +453,7 @@ class AzureStorageQueue(QueueInterface):
                 max_messages=1
             )
             for msg in messages:
-                content = json.loads(msg.content)
+                content = orjson.loads(msg.content)
                 return QueueMessage(
                     id=msg.id,
                     content=content,
@@ -3,21 +3,17 @@ Azure Service Bus Queue with Azure AD Authentication
 This version uses managed identity or Azure CLI credentials instead of connection strings
 """
 import os
-import json
-from typing import Optional, Dict, Any
-from queue_interface import QueueInterface, QueueMessage
+from queue_interface import AzureServiceBusQueue, QueueInterface, get_azure_credential
 
 
-class AzureServiceBusQueueAAD(QueueInterface):
+class AzureServiceBusQueueAAD(AzureServiceBusQueue):
     """Azure Service Bus queue implementation using Azure AD authentication"""
 
-    def __init__(self, namespace: str, queue_name: str = 'jobs'):
-        from azure.identity import DefaultAzureCredential, ManagedIdentityCredential
-        from azure.servicebus import ServiceBusClient
-        import os
+    LOG_PREFIX = '[ServiceBus AAD]'
 
+    def __init__(self, namespace: str, queue_name: str = 'jobs'):
+        super().__init__(connection_string=None, queue_name=queue_name)
         self.namespace = namespace
-        self.queue_name = queue_name
         # Handle both formats: "namespace" or "namespace.servicebus.windows.net"
         if '.servicebus.windows.net' in namespace:
             self.fully_qualified_namespace = namespace
@@ -29,8 +25,7 @@ class AzureServiceBusQueueAAD(QueueInterface):
         # - Managed Identity (when running in Azure)
         # - Azure CLI (when running locally)
         print("[Queue] Using DefaultAzureCredential (supports Workload Identity)")
-        self.credential = DefaultAzureCredential()
-        self._client = None
+        self.credential = get_azure_credential()
 
     def _get_client(self):
         if not self._client:
@@ -41,64 +36,6 @@ class AzureServiceBusQueueAAD(QueueInterface):
             )
         return self._client
 
-    def send_message(self, message: Dict[Any, Any]) -> bool:
-        """Send message to Service Bus"""
-        try:
-            from azure.servicebus import ServiceBusMessage
-            client = self._get_client()
-            with client.get_queue_sender(queue_name=self.queue_name) as sender:
-                sb_message = ServiceBusMessage(json.dumps(message))
-                sender.send_messages(sb_message)
-            return True
-        except Exception as e:
-            print(f"[ServiceBus AAD] Error sending message: {e}")
-            return False
-
-    def receive_message(self, visibility_timeout: int = 300) -> Optional[QueueMessage]:
-        """Receive message from Service Bus"""
-        try:
-            client = self._get_client()
-            with client.get_queue_receiver(
-                queue_name=self.queue_name,
-                max_wait_time=5
-            ) as receiver:
-                messages = receiver.receive_messages(max_message_count=1, max_wait_time=5)
-                if messages:
-                    msg = messages[0]
-                    content = json.loads(str(msg))
-                    return QueueMessage(
-                        id=msg.message_id,
-                        content=content,
-                        receipt_handle=msg
-                    )
-        except Exception as e:
-            import traceback
-            print(f"[ServiceBus AAD] Error receiving message: {e}")
-            print(f"[ServiceBus AAD] Error details: {traceback.format_exc()}")
-        return None
-
-    def delete_message(self, message: QueueMessage) -> bool:
-        """Complete the message in Service Bus"""
-        try:
-            client = self._get_client()
-            with client.get_queue_receiver(queue_name=self.queue_name) as receiver:
-                receiver.complete_message(message.receipt_handle)
-            return True
-        except Exception as e:
-            print(f"[ServiceBus AAD] Error completing message: {e}")
-            return False
-
-    def return_message(self, message: QueueMessage) -> bool:
-        """Abandon the message to return it to queue"""
-        try:
-            client = self._get_client()
-            with client.get_queue_receiver(queue_name=self.queue_name) as receiver:
-                receiver.abandon_message(message.receipt_handle)
-            return True
-        except Exception as e:
-            print(f"[ServiceBus AAD] Error abandoning message: {e}")
-            return False
-
 
 def get_queue_with_aad() -> QueueInterface:
     """
@@ -123,7 +60,6 @@ def get_queue_with_aad() -> QueueInterface:
         conn_str = os.getenv('AZURE_SERVICEBUS_CONNECTION_STRING')
         if conn_str:
             print("[Queue] Using Azure Service Bus with connection string")
-            from queue_interface import AzureServiceBusQueue
             return AzureServiceBusQueue(conn_str)
 
         raise ValueError("Neither AZURE_SERVICEBUS_NAMESPACE nor AZURE_SERVICEBUS_CONNECTION_STRING is set")
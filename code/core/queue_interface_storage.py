@@ -3,16 +3,15 @@ Azure Storage Queue with Azure AD Authentication
 This version uses Workload Identity / Managed Identity instead of connection strings
 """
 import os
-import json
+import orjson
 from typing import Optional, Dict, Any
-from queue_interface import QueueInterface, QueueMessage
+from queue_interface import QueueInterface, QueueMessage, get_azure_credential
 
 
 class AzureStorageQueueAAD(QueueInterface):
     """Azure Storage Queue implementation using Azure AD authentication"""
 
     def __init__(self, storage_account_name: str, queue_name: str = 'crawler-jobs'):
-        from azure.identity import DefaultAzureCredential
         from azure.storage.queue import QueueServiceClient
 
         self.storage_account_name = storage_account_name
@@ -23,7 +22,7 @@ class AzureStorageQueueAAD(QueueInterface):
         # - Workload Identity (when AZURE_FEDERATED_TOKEN_FILE is set)
         # - Managed Identity (when running in Azure)
         # - Azure CLI (when running locally)
-        self.credential = DefaultAzureCredential()
+        self.credential = get_azure_credential()
 
         # Create queue service client
         self.service_client = QueueServiceClient(account_url=self.account_url, credential=self.credential)
@@ -32,7 +31,7 @@ class AzureStorageQueueAAD(QueueInterface):
     def send_message(self, message: Dict[str, Any]) -> bool:
         """Send message to Storage Queue"""
         try:
-            content = json.dumps(message)
+            content = orjson.dumps(message).decode('utf-8')
             self.queue_client.send_message(content)
             return True
         except Exception as e:
@@ -49,7 +48,7 @@ class AzureStorageQueueAAD(QueueInterface):
             )
 
             for msg in messages:
-                content = json.loads(msg.content)
+                content = orjson.loads(msg.content)
                 return QueueMessage(
                     id=msg.id,
                     content=content,
@@ -101,12 +100,11 @@ def ensure_queue_exists(storage_account_name: str, queue_name: str = 'crawler-jo
     Ensure the Azure Storage Queue exists, creating it if necessary.
     This should be called once at application startup.
     """
-    from azure.identity import DefaultAzureCredential
     from azure.storage.queue import QueueServiceClient
     from azure.core.exceptions import ResourceExistsError
 
     account_url = f"https://{storage_account_name}.queue.core.windows.net"
-    credential = DefaultAzureCredential()
+    credential = get_azure_credential()
     service_client = QueueServiceClient(account_url=account_url, credential=credential)
     queue_client = service_client.get_queue_client(queue_name)
 
@@ -1,33 +1,54 @@
+import logging
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import db
 import master
+from logging_setup import configure_logging
+
+log = logging.getLogger('scheduler')
+
+# Sites processed at once; each run is mostly waiting on HTTP, the DB and the
+# queue, so due sites overlap instead of running back to back
+PROCESS_SITE_WORKERS = int(os.getenv('PROCESS_SITE_WORKERS', '8'))
 
 def get_sites_to_process():
     """Get sites that need processing based on their interval"""
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    
-    # Get sites where last_processed + interval_hours < now
-    cursor.execute("""
-        SELECT site_url, process_interval_hours 
-        FROM sites 
-        WHERE DATEADD(hour, process_interval_hours, last_processed) <= GETUTCDATE() 
-           OR last_processed IS NULL
-    """)
-    return cursor.fetchall()
-
-def update_site_last_processed(site_url):
+    with db.connection() as conn:
+        cursor = conn.cursor()
+
+        # Get sites where last_processed + interval_hours < now
+        cursor.execute("""
+            SELECT site_url, user_id, process_interval_hours
+            FROM sites
+            WHERE DATEADD(hour, process_interval_hours, last_processed) <= GETUTCDATE() 
+               OR last_processed IS NULL
+        """)
+        return cursor.fetchall()
+
+def update_site_last_processed(site_url, user_id):
     """Update the last_processed time for a site"""
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE sites SET last_processed = GETUTCDATE() WHERE site_url = %s",
-        (site_url,)
-    )
-    conn.commit()
-    conn.close()
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE sites SET last_processed = GETUTCDATE() WHERE site_url = %s AND user_id = %s",
+            (site_url, user_id)
+        )
+        conn.commit()
+
+def process_due_site(site_url, user_id):
+    """Process one site and stamp its last_processed time"""
+    log.info(f"Processing site: {site_url}")
+    try:
+        # Process the site using existing master functionality
+        master.process_site(site_url, user_id)
+
+        # Update last processed time
+        update_site_last_processed(site_url, user_id)
+
+    except Exception as e:
+        log.error(f"Error processing site {site_url}: {e}")
 
 def scheduler_loop():
     """Main scheduler loop that processes sites at their intervals"""
@@ -36,26 +57,18 @@ def scheduler_loop():
             # Get sites that need processing
             sites = get_sites_to_process()
             
-            for site_url, interval_hours in sites:
-                print(f"Processing site: {site_url}")
-                try:
-                    # Process the site using existing master functionality
-                    master.process_site(site_url)
-                    
-                    # Update last processed time
-                    update_site_last_processed(site_url)
-                    
-                except Exception as e:
-                    print(f"Error processing site {site_url}: {e}")
-                    continue
-            
+            with ThreadPoolExecutor(max_workers=PROCESS_SITE_WORKERS, thread_name_prefix='process-site') as executor:
+                for site_url, user_id, interval_hours in sites:
+                    executor.submit(process_due_site, site_url, user_id)
+
             # Sleep for a while before next check
             # In production this would be configured based on needs
             time.sleep(300)  # 5 minutes
             
         except Exception as e:
-            print(f"Scheduler error: {e}")
+            log.error(f"Scheduler error: {e}")
             time.sleep(60)  # Wait a minute on error
 
 if __name__ == '__main__':
+    configure_logging()
     scheduler_loop()
\ No newline at end of file
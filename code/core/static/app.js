@@ -256,7 +256,7 @@ async function updateStats() {
 // Load and display queue status
 async function loadQueueStatus() {
     try {
-        const status = await apiRequest('/queue/status');
+        const status = await apiRequest('/queue/status?include_jobs=true');
         const container = document.getElementById('queueStatus');
 
         if (!container) return;
@@ -131,12 +131,16 @@ class EmbeddingWrapper:
         self.azure_endpoint = os.getenv('AZURE_OPENAI_ENDPOINT')
         self.azure_api_key = os.getenv('AZURE_OPENAI_KEY')
         self.azure_deployment = os.getenv('AZURE_OPENAI_EMBEDDING_DEPLOYMENT', 'text-embedding-3-small')
+        # Shorter vectors (text-embedding-3 only) cut response size, memory and index storage;
+        # changing this requires recreating the search index
+        self.dimensions = int(os.getenv('AZURE_OPENAI_EMBEDDING_DIMENSIONS', '1536'))
 
         if self.azure_endpoint and self.azure_api_key:
             self.azure_provider = AzureOpenAIEmbedding(
                 endpoint=self.azure_endpoint,
                 api_key=self.azure_api_key,
-                deployment=self.azure_deployment
+                deployment=self.azure_deployment,
+                dimensions=self.dimensions if self.dimensions != 1536 else None
             )
         else:
             self.azure_provider = None
@@ -152,7 +156,7 @@ class EmbeddingWrapper:
             return await self.azure_provider.get_embedding(text)
         else:
             # Return a dummy embedding for testing if no provider configured
-            return [0.0] * 1536  # Standard embedding dimension
+            return [0.0] * self.dimensions
 
     async def batch_get_embeddings(self, texts: List[str], provider: str = "azure_openai") -> List[List[float]]:
         """Generate embeddings for multiple texts"""
@@ -163,7 +167,7 @@ class EmbeddingWrapper:
             return await self.azure_provider.get_batch_embeddings(texts)
         else:
             # Return dummy embeddings for testing
-            return [[0.0] * 1536 for _ in texts]
+            return [[0.0] * self.dimensions for _ in texts]
 
 
 class VectorDB:
@@ -206,7 +210,7 @@ class VectorDB:
                     name="embedding",
                     type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
                     searchable=True,
-                    vector_search_dimensions=1536,
+                    vector_search_dimensions=self.embedding_wrapper.dimensions,
                     vector_search_profile_name="default"
                 ),
             ]
@@ -231,8 +235,9 @@ class VectorDB:
 
             self.index_client.create_index(index)
 
-    def _prepare_document(self, id: str, site: str, json_obj: dict, embedding: List[float]) -> dict:
-        """Prepare document for indexing"""
+    def _prepare_document(self, id: str, site: str, json_obj: dict, embedding: List[float],
+                          timestamp: Optional[str] = None) -> dict:
+        """Prepare document for indexing (batches pass one shared timestamp)"""
         # Extract type information
         obj_type = json_obj.get('@type', 'Unknown')
         if isinstance(obj_type, list):
@@ -252,7 +257,7 @@ class VectorDB:
             "site": site,
             "type": obj_type,
             "content": content,
-            "timestamp": datetime.utcnow().isoformat() + 'Z',  # Add Z for UTC timezone
+            "timestamp": timestamp or datetime.utcnow().isoformat() + 'Z',  # Add Z for UTC timezone
             "embedding": embedding
         }
 
@@ -291,29 +296,12 @@ class VectorDB:
                 print(f"[Vector DB] Sample sites: {[site for _, site, _ in items[:3]]}")
                 print(f"[Vector DB] Sample IDs: {[id for id, _, _ in items[:3]]}")
 
-            # Process in batches to avoid token limits
-            # Azure OpenAI embedding API has limits on:
-            # - Max 2048 items per request
-            # - Max tokens per request (varies by model, ~8191 for text-embedding-3-small)
-            # We'll use a conservative batch size of 50 items
-            embedding_batch_size = 50
-
-            print(f"[Vector DB] Starting embedding generation for {len(items)} items in batches of {embedding_batch_size}")
-            all_embeddings = []
-            for i in range(0, len(items), embedding_batch_size):
-                batch_items = items[i:i + embedding_batch_size]
-                # Extract essential fields instead of using full JSON
-                texts = [extract_essential_fields(obj) for _, _, obj in batch_items]
-                print(f"[Vector DB] Batch {i//embedding_batch_size + 1}: Generating embeddings for {len(batch_items)} items...")
-                batch_embeddings = await self.embedding_wrapper.batch_get_embeddings(texts)
-                all_embeddings.extend(batch_embeddings)
-                print(f"[Vector DB] Batch {i//embedding_batch_size + 1}: Successfully generated {len(batch_embeddings)} embeddings")
-                print(f"[Vector DB] Generated embeddings for batch {i//embedding_batch_size + 1}/{(len(items) + embedding_batch_size - 1)//embedding_batch_size} ({len(batch_items)} items)")
-
-                # Add small delay between batches to avoid rate limits
-                if i + embedding_batch_size < len(items):
-                    import asyncio
-                    await asyncio.sleep(1)  # 1 second delay between batches
+            # The embedding provider packs texts into requests under the API's
+            # input/token limits and runs those requests concurrently
+            print(f"[Vector DB] Starting embedding generation for {len(items)} items")
+            # Extract essential fields instead of using full JSON
+            texts = [extract_essential_fields(obj) for _, _, obj in items]
+            all_embeddings = await self.embedding_wrapper.batch_get_embeddings(texts)
 
             print(f"[Vector DB] Total embeddings generated: {len(all_embeddings)}")
 
@@ -321,8 +309,9 @@ class VectorDB:
                 # Prepare documents
                 print(f"[Vector DB] Preparing {len(items)} documents for upload...")
                 documents = []
+                timestamp = datetime.utcnow().isoformat() + 'Z'
                 for (id, site, json_obj), embedding in zip(items, all_embeddings):
-                    document = self._prepare_document(id, site, json_obj, embedding)
+                    document = self._prepare_document(id, site, json_obj, embedding, timestamp)
                     documents.append(document)
 
                 print(f"[Vector DB] Prepared {len(documents)} documents")
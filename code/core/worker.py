@@ -183,7 +183,7 @@ def process_job(conn, job):
             except Exception as e:
                 error_msg = f"Failed to extract schema data: {str(e)}"
                 print(f"[WORKER ERROR] {error_msg}")
-                db.log_processing_error(conn, job['file_url'], user_id, 'extraction_failed', error_msg, str(e.__class__.__name__))
+                db.log_processing_error(job['file_url'], user_id, 'extraction_failed', error_msg, str(e.__class__.__name__))
                 return False
 
             print(f"[WORKER] Extracted {len(ids)} IDs, {len(objects)} objects from {job['file_url']}")
@@ -192,7 +192,7 @@ def process_job(conn, job):
             if len(ids) == 0:
                 error_msg = "No schema.org objects with @id found in file"
                 print(f"[WORKER WARNING] {error_msg}")
-                db.log_processing_error(conn, job['file_url'], user_id, 'no_ids_found', error_msg, f"Objects: {len(objects)}")
+                db.log_processing_error(job['file_url'], user_id, 'no_ids_found', error_msg, f"Objects: {len(objects)}")
                 # Continue processing - this might not be an error for some files
 
             if len(ids) > 0:
@@ -212,8 +212,10 @@ def process_job(conn, job):
             items_to_add = []
             skipped_existing = 0
             skipped_breadcrumbs = 0
+            missing_objects = 0
+            added_ref_counts = db.count_id_references_many(conn, added_ids, user_id)
             for id in added_ids:
-                ref_count = db.count_id_references(conn, id, user_id)
+                ref_count = added_ref_counts[id]
                 if ref_count == 1:
                     # First occurrence of this ID - prepare for batch add to vector DB
                     obj = next((obj for obj in objects if obj['@id'] == id), None)
@@ -222,11 +224,10 @@ def process_job(conn, job):
                         obj_type = obj.get('@type', '')
                         if obj_type == 'BreadcrumbList' or (isinstance(obj_type, list) and 'BreadcrumbList' in obj_type):
                             skipped_breadcrumbs += 1
-                            print(f"[WORKER] Skipping BreadcrumbList item: {id}")
                             continue
                         items_to_add.append((id, job['site'], obj))
                     else:
-                        print(f"[WORKER] WARNING: Could not find object for ID {id}")
+                        missing_objects += 1
                 else:
                     skipped_existing += 1
 
@@ -234,6 +235,8 @@ def process_job(conn, job):
                 print(f"[WORKER] Skipped {skipped_existing} IDs that already exist in other files")
             if skipped_breadcrumbs > 0:
                 print(f"[WORKER] Skipped {skipped_breadcrumbs} BreadcrumbList items")
+            if missing_objects > 0:
+                print(f"[WORKER] WARNING: Could not find objects for {missing_objects} IDs")
 
             # Batch add to vector DB
             if items_to_add:
@@ -252,15 +255,16 @@ def process_job(conn, job):
                     print(f"[WORKER ERROR] {error_msg}")
                     import traceback
                     error_details = traceback.format_exc()
-                    db.log_processing_error(conn, job['file_url'], user_id, 'vector_db_add_failed', error_msg, error_details)
+                    db.log_processing_error(job['file_url'], user_id, 'vector_db_add_failed', error_msg, error_details)
                     # Don't return False - we still updated the IDs table, so mark as processed
             else:
                 print(f"[WORKER] No new items to add to vector DB (all IDs already exist)")
 
             # Collect IDs to batch delete from vector DB
             ids_to_delete = []
+            removed_ref_counts = db.count_id_references_many(conn, removed_ids, user_id)
             for id in removed_ids:
-                ref_count = db.count_id_references(conn, id, user_id)
+                ref_count = removed_ref_counts[id]
                 if ref_count == 0:
                     # ID no longer exists in any file - prepare for batch delete
                     ids_to_delete.append(id)
@@ -276,7 +280,7 @@ def process_job(conn, job):
             update_site_last_processed(job['site'])
 
             # Clear any previous errors for this file since it processed successfully
-            db.clear_file_errors(conn, job['file_url'], user_id)
+            db.clear_file_errors(job['file_url'], user_id)
 
             print(f"[WORKER] ========== Completed process_file for {job['file_url']} ==========")
             return True
@@ -284,19 +288,17 @@ def process_job(conn, job):
         elif job['type'] == 'process_removed_file':
             print(f"[WORKER] Processing removal: {job['file_url']}")
 
-            # Get IDs that were in this file for this user
-            ids = db.get_file_ids(conn, job['file_url'], user_id)
+            # Remove all ID mappings for this file (deletes from ids table);
+            # the deleted IDs come back from the same statement
+            _, ids = db.update_file_ids(conn, job['file_url'], user_id, set())
             print(f"[WORKER] Found {len(ids)} IDs to check for removal")
 
-            # Remove all ID mappings for this file (deletes from ids table)
-            db.update_file_ids(conn, job['file_url'], user_id, set())
-
             # Check each ID to see if it's gone globally (for this user)
             removed_from_vector_db = 0
+            ref_counts = db.count_id_references_many(conn, ids, user_id)
             for id in ids:
-                if db.count_id_references(conn, id, user_id) == 0:
+                if ref_counts[id] == 0:
                     # ID no longer exists in any file - remove from vector DB
-                    print(f"[WORKER] Removing from vector DB: {id}")
                     vector_db_delete(id)
                     removed_from_vector_db += 1
 
@@ -339,31 +341,14 @@ def worker_loop():
     # Get queue implementation
     queue = get_queue()
 
-    conn = None
+    # Jobs borrow a connection from the process pool; it pings connections
+    # that sat idle instead of running SELECT 1 before every job
+    pool = db.get_pool()
 
     def get_db_connection():
-        """Get a fresh database connection"""
-        nonlocal conn
+        """Borrow a pooled database connection (None if the database is unreachable)"""
         try:
-            if conn:
-                try:
-                    # Test if connection is still alive
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT 1")
-                    cursor.close()
-                except:
-                    # Connection is dead, close it
-                    try:
-                        conn.close()
-                    except:
-                        pass
-                    conn = None
-
-            if not conn:
-                conn = db.get_connection()
-                print("[WORKER] Database connection established")
-
-            return conn
+            return pool.getconn()
         except Exception as e:
             print(f"[WORKER] Error getting database connection: {e}")
             return None
@@ -412,6 +397,7 @@ def worker_loop():
                     continue
 
                 # Process job
+                discard_conn = False
                 try:
                     success = process_job(conn, job)
                 except Exception as e:
@@ -423,12 +409,10 @@ def worker_loop():
                     # Check if it's a connection error
                     if "Communication link failure" in str(e) or "08S01" in str(e):
                         print(f"[WORKER] Database connection lost, will reconnect on next job")
-                        try:
-                            conn.close()
-                        except:
-                            pass
-                        conn = None
+                        discard_conn = True
                     success = False
+                finally:
+                    pool.putconn(conn, discard=discard_conn)
 
                 # Update status
                 worker_status['last_job_at'] = datetime.utcnow().isoformat()
@@ -462,18 +446,16 @@ def worker_loop():
         import traceback
         traceback.print_exc()
     finally:
-        if conn:
-            try:
-                conn.close()
-            except:
-                pass
+        queue.close()
+        pool.close_all()
 
 if __name__ == '__main__':
     # Test database connectivity first
     print("[STARTUP] Testing database connection...")
     try:
-        test_conn = db.get_connection()
-        test_conn.close()
+        # Keeps the connection in the pool for the first job
+        with db.connection():
+            pass
         print("[STARTUP] ✓ Database connection successful")
     except Exception as e:
         print(f"[STARTUP] ✗ Database connection failed: {str(e)}")
@@ -485,7 +467,7 @@ if __name__ == '__main__':
         print("[STARTUP] Testing Service Bus connection...")
         try:
             from azure.servicebus import ServiceBusClient
-            from azure.identity import DefaultAzureCredential
+            from queue_interface import get_azure_credential
 
             conn_str = os.getenv('AZURE_SERVICEBUS_CONNECTION_STRING')
             namespace = os.getenv('AZURE_SERVICEBUS_NAMESPACE')
@@ -495,7 +477,7 @@ if __name__ == '__main__':
                 client = ServiceBusClient.from_connection_string(conn_str)
                 print("[STARTUP] Using Service Bus connection string")
             elif namespace:
-                credential = DefaultAzureCredential()
+                credential = get_azure_credential()
                 fully_qualified_namespace = namespace if '.servicebus.windows.net' in namespace else f"{namespace}.servicebus.windows.net"
                 client = ServiceBusClient(fully_qualified_namespace, credential)
                 print(f"[STARTUP] Using Azure AD auth for namespace: {fully_qualified_namespace}")
@@ -514,7 +496,7 @@ if __name__ == '__main__':
         print("[STARTUP] Testing Storage Queue connection...")
         try:
             from azure.storage.queue import QueueServiceClient
-            from azure.identity import DefaultAzureCredential
+            from queue_interface import get_azure_credential
 
             storage_account = os.getenv('AZURE_STORAGE_ACCOUNT_NAME')
             queue_name = os.getenv('AZURE_STORAGE_QUEUE_NAME', 'crawler-jobs')
@@ -524,7 +506,7 @@ if __name__ == '__main__':
                 sys.exit(1)
 
             account_url = f"https://{storage_account}.queue.core.windows.net"
-            credential = DefaultAzureCredential()
+            credential = get_azure_credential()
             service_client = QueueServiceClient(account_url=account_url, credential=credential)
             queue_client = service_client.get_queue_client(queue_name)
 
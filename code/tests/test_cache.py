@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""Tests for the in-process TTL cache"""
+
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
+
+from cache import TTLCache
+
+
+def test_ttl_cache_expires_entries():
+    """Entries are dropped once their TTL has passed"""
+    cache = TTLCache(ttl=0)
+    cache.set('user', ['site'])
+    assert cache.get('user') is None
+
+    cache = TTLCache(ttl=60)
+    cache.set('user', ['site'])
+    assert cache.get('user') == ['site']
+    assert cache.pop('user') == ['site']
+    assert cache.get('user') is None
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    """Past maxsize the least recently used key is evicted"""
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert len(cache) == 2
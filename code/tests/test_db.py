@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""Tests for db.py helpers that don't need a live database"""
+
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
+
+import db
+
+
+class FakeConnection:
+    """Minimal stand-in for a pymssql connection"""
+
+    def __init__(self):
+        self.closed = False
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    """Cursor that records statements on its connection and serves its result sets"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+
+    def execute(self, sql, params=()):
+        self.conn.executed.append((sql, params))
+        if self.conn.rowcounts:
+            self.rowcount = self.conn.rowcounts.pop(0)
+
+    def fetchall(self):
+        return self.conn.results[0] if self.conn.results else []
+
+    def nextset(self):
+        self.conn.results.pop(0)
+        return True
+
+
+class FakeQueryConnection(FakeConnection):
+    """
+    Connection stand-in for query helpers: results are the result sets the
+    cursor returns in order, rowcounts the rowcount after each execute()
+    """
+
+    def __init__(self, results=(), rowcounts=()):
+        super().__init__()
+        self.results = list(results)
+        self.rowcounts = list(rowcounts)
+        self.executed = []
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_connection_pool_reuses_connections(monkeypatch):
+    """A returned connection is handed out again instead of reconnecting"""
+    opened = []
+
+    def fake_connect():
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(db, 'get_connection', fake_connect)
+    pool = db.ConnectionPool(max_size=2)
+
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    assert first is second
+    assert len(opened) == 1
+    assert first.rollbacks == 2
+    assert not first.closed
+
+
+def test_connection_pool_recycles_idle_connections(monkeypatch):
+    """Connections idle for longer than max_idle_seconds are closed and replaced"""
+    monkeypatch.setattr(db, 'get_connection', FakeConnection)
+    pool = db.ConnectionPool(max_size=1, max_idle_seconds=0)
+
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    assert first is not second
+    assert first.closed
+
+
+def test_connection_pool_replaces_dead_connections(monkeypatch):
+    """Idle connections that fail the SELECT 1 check are closed instead of handed out"""
+    class DeadConnection(FakeConnection):
+        def cursor(self):
+            raise db.pymssql.OperationalError("Communication link failure")
+
+    opened = [DeadConnection(), FakeConnection()]
+    monkeypatch.setattr(db, 'get_connection', lambda: opened.pop(0))
+    pool = db.ConnectionPool(max_size=1, ping_after_seconds=0)
+
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    assert first is not second
+    assert first.closed
+
+
+def test_connection_pool_fill_opens_min_size_connections(monkeypatch):
+    """fill() pre-opens idle connections up to min_size"""
+    opened = []
+
+    def fake_connect():
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(db, 'get_connection', fake_connect)
+    pool = db.ConnectionPool(max_size=5, min_size=3)
+    pool.fill()
+    pool.fill()
+
+    assert len(opened) == 3
+    with pool.connection() as conn:
+        assert conn in opened
+
+
+def test_nested_connection_blocks_share_a_connection(monkeypatch):
+    """An inner db.connection() reuses the outer block's connection"""
+    pool = db.ConnectionPool(max_size=1, timeout=0)
+    monkeypatch.setattr(db, 'get_connection', FakeConnection)
+    monkeypatch.setattr(db, 'get_pool', lambda: pool)
+
+    with db.connection() as outer:
+        with db.connection() as inner:
+            assert inner is outer
+        assert outer.rollbacks == 0
+
+    assert outer.rollbacks == 1
+
+
+def test_prepared_statement_builds_sp_executesql():
+    """Statements are sent through sp_executesql with typed, positional parameters"""
+    conn = FakeQueryConnection()
+    statement = db.PreparedStatement(
+        "SELECT id FROM ids WHERE file_url = @file_url AND user_id = @user_id AND id LIKE 'x%'",
+        file_url='VARCHAR(500)', user_id='VARCHAR(255)'
+    )
+    statement.execute(conn.cursor(), 'a.json', 'github:1')
+
+    sql, params = conn.executed[0]
+    assert sql == (
+        "EXEC sp_executesql N'SELECT id FROM ids WHERE file_url = @file_url AND user_id = @user_id AND id LIKE ''x%%''', "
+        "N'@file_url VARCHAR(500), @user_id VARCHAR(255)', @file_url = %s, @user_id = %s"
+    )
+    assert params == ('a.json', 'github:1')
+
+
+def test_multi_row_insert_batches_under_parameter_limit():
+    """Rows are sent as multi-row VALUES lists, split to respect the parameter limit"""
+    conn = FakeQueryConnection()
+    rows = [(f'file{i}', f'map{i}') for i in range(5)]
+    db._multi_row_insert(conn.cursor(), 'INSERT INTO t (a, b) VALUES ', rows, max_params=4)
+    executed = conn.executed
+
+    assert [sql for sql, _ in executed] == [
+        'INSERT INTO t (a, b) VALUES (%s,%s),(%s,%s)',
+        'INSERT INTO t (a, b) VALUES (%s,%s),(%s,%s)',
+        'INSERT INTO t (a, b) VALUES (%s,%s)',
+    ]
+    assert executed[0][1] == ('file0', 'map0', 'file1', 'map1')
+    assert executed[2][1] == ('file4', 'map4')
+
+
+def test_update_site_files_diffs_on_the_server():
+    """The current file list goes up as one JSON parameter and the diff comes back from OUTPUT"""
+    conn = FakeQueryConnection(results=[[('gone.json',)], [('new.json',)]])
+    current = [('site.com', 'map.xml', 'a.json'), ('site.com', 'map.xml', 'new.json')]
+    assert db.update_site_files(conn, 'site.com', 'github:1', current) == (['new.json'], ['gone.json'])
+    assert len(conn.executed) == 1
+    assert conn.commits == 1
+    assert db.json.loads(conn.executed[0][1][0]) == [['a.json', 'map.xml'], ['new.json', 'map.xml']]
+
+
+def test_site_locks_are_released_when_unused():
+    """A site's lock is shared while referenced and dropped from the map afterwards"""
+    lock = db.get_site_lock('example.com', 'github:1')
+    assert db.get_site_lock('example.com', 'github:1') is lock
+    assert db.get_site_lock('example.com', 'github:2') is not lock
+
+    del lock
+    assert ('example.com', 'github:1') not in db._site_locks
+
+
+def test_update_file_ids_diffs_on_the_server():
+    """All current IDs go up as one JSON parameter and the diff comes back from OUTPUT"""
+    conn = FakeQueryConnection(results=[[('old1',), ('old2',)], [('new1',)]])
+    ids = {f'id{i}' for i in range(3000)}
+    added, removed = db.update_file_ids(conn, 'a.json', 'github:1', ids)
+
+    assert (added, removed) == (['new1'], ['old1', 'old2'])
+    assert len(conn.executed) == 1
+    assert set(db.json.loads(conn.executed[0][1][0])) == ids
+    assert conn.executed[0][1][-4:] == (3000, 'a.json', 'github:1', 3000)
+
+
+def test_count_id_references_many_defaults_to_zero():
+    """IDs the query returns no row for are reported with a count of 0"""
+    conn = FakeQueryConnection(results=[[('a', 2)]])
+    assert db.count_id_references_many(conn, ['a', 'b'], 'github:1') == {'a': 2, 'b': 0}
+    assert db.count_id_references_many(conn, [], 'github:1') == {}
+    assert len(conn.executed) == 1
+
+
+def test_normalize_site_url():
+    """Protocol, www. prefix and trailing slashes are stripped"""
+    assert db.normalize_site_url('https://www.imdb.com') == 'imdb.com'
+    assert db.normalize_site_url('http://example.com/') == 'example.com'
+    assert db.normalize_site_url('www.site.org//') == 'site.org'
+    assert db.normalize_site_url('site.com/path') == 'site.com/path'
+    assert db.normalize_site_url('') == ''
+
+
+def test_processing_errors_are_written_in_one_batch(monkeypatch):
+    """Queued errors and clears are applied in order, with one commit"""
+    conn = FakeQueryConnection()
+
+    @db.contextmanager
+    def fake_connection():
+        yield conn
+
+    monkeypatch.setattr(db, 'connection', fake_connection)
+    ops = [('log', (f'file{i}.json', 'github:1', 'no_ids_found', 'msg', None)) for i in range(3)]
+    ops.append(('clear', ('file0.json', 'github:1')))
+    ops.append(('log', ('file0.json', 'github:1', 'vector_db_add_failed', 'msg', None)))
+    db._write_processing_errors(ops)
+    executed = conn.executed
+
+    assert [sql.split()[0] for sql, _ in executed] == ['INSERT', 'DELETE', 'INSERT']
+    assert len(executed[0][1]) == 15
+    assert executed[1][1] == ('file0.json', 'github:1')
+    assert executed[2][1][2] == 'vector_db_add_failed'
+    assert conn.commits == 1
+
+
+def test_get_all_sites_returns_site_rows():
+    """Rows come back as Site objects that orjson serializes as JSON objects"""
+    import orjson
+
+    conn = FakeQueryConnection(results=[[('a.com', 24, None, True, db.datetime(2024, 1, 2, 3, 4, 5))]])
+    sites = db.get_all_sites(conn, 'github:1')
+    assert sites[0].site_url == 'a.com'
+    assert orjson.loads(orjson.dumps(sites)) == [{
+        'site_url': 'a.com', 'process_interval_hours': 24, 'last_processed': None,
+        'is_active': True, 'created_at': '2024-01-02T03:04:05'
+    }]
+
+
+def test_purge_old_errors_deletes_in_batches():
+    """Batches repeat until one deletes fewer rows than the batch size"""
+    conn = FakeQueryConnection(rowcounts=[2, 2, 1])
+    assert db.purge_old_errors(conn, retention_days=30, batch_size=2) == 5
+    assert [params for _, params in conn.executed] == [(2, 30)] * 3
+    assert conn.commits == 3
+
+
+def test_run_sync_calls_fn_with_a_pooled_connection(monkeypatch):
+    """run_sync runs fn(conn, *args) off the event loop and returns its result"""
+    import asyncio
+    import threading
+
+    pool = db.ConnectionPool(max_size=1)
+    monkeypatch.setattr(db, 'get_connection', FakeConnection)
+    monkeypatch.setattr(db, 'get_pool', lambda: pool)
+    main_thread = threading.current_thread()
+
+    def fn(conn, value):
+        assert isinstance(conn, FakeConnection)
+        assert threading.current_thread() is not main_thread
+        return value * 2
+
+    assert asyncio.run(db.run_sync(fn, 21)) == 42
+
+
+def test_run_sync_does_not_reuse_the_callers_connection(monkeypatch):
+    """run_sync inside an open db.connection() block borrows its own connection"""
+    import asyncio
+
+    pool = db.ConnectionPool(max_size=2)
+    monkeypatch.setattr(db, 'get_connection', FakeConnection)
+    monkeypatch.setattr(db, 'get_pool', lambda: pool)
+
+    with db.connection() as outer:
+        inner = asyncio.run(db.run_sync(lambda conn: conn))
+        with db.connection() as nested:
+            assert nested is outer
+
+    assert isinstance(inner, FakeConnection)
+    assert inner is not outer
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 """Test script for master.py with local test data"""
 
+import io
+import pytest
 import sys
 import os
 
@@ -53,6 +55,148 @@ def test_xml_parsing_directly():
         print(f"  - {url}")
     print()
 
+def test_xml_parsing_filters_and_resolves_urls():
+    """Only schema.org entries are returned, made absolute, with or without the sitemap namespace"""
+    namespaced = b"""<?xml version="1.0" encoding="utf-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url contentType="structuredData/schema.org"><loc> 1.json </loc></url>
+  <url contentType="text/html"><loc>page.html</loc></url>
+  <url contentType="structuredData/schema.org"><loc>http://other.com/2.json</loc></url>
+</urlset>"""
+    assert master.parse_schema_map_xml(namespaced, "http://site.com/data/") == [
+        "http://site.com/data/1.json", "http://other.com/2.json"
+    ]
+
+    bare = '<urlset><url contentType="structuredData/schema.org"><loc>/a.json</loc></url></urlset>'
+    assert master.parse_schema_map_xml(bare, "http://site.com/") == ["http://site.com/a.json"]
+
+    assert master.parse_schema_map_xml(io.BytesIO(namespaced), "http://site.com/data/")[0] == "http://site.com/data/1.json"
+
+    assert master.parse_schema_map_xml(b"<urlset><url>", "http://site.com/") == []
+
+def test_xml_parsing_does_not_expand_external_entities(tmp_path):
+    """A map can't pull local files into its URLs via external entities (lxml or stdlib parser)"""
+    secret = tmp_path / "secret.txt"
+    secret.write_text("TOPSECRET")
+    xml_content = f"""<?xml version="1.0"?>
+<!DOCTYPE urlset [<!ENTITY x SYSTEM "file://{secret}">]>
+<urlset><url contentType="structuredData/schema.org"><loc>/a&x;.json</loc></url></urlset>"""
+
+    urls = master.parse_schema_map_xml(xml_content, "http://site.com/")
+    assert not any("TOPSECRET" in url for url in urls)
+
+def test_lxml_iterparse_options_disable_entity_resolution():
+    """When lxml is the parser, entity resolution and network access are turned off"""
+    pytest.importorskip("lxml")
+    assert master._LXML
+    assert master._ITERPARSE_OPTIONS == {'resolve_entities': False, 'no_network': True, 'huge_tree': False}
+
+def test_resolve_url_matches_urljoin():
+    """The absolute-URL shortcut gives the same result as urljoin"""
+    for url in ["https://a.com/x.json", "http://a.com/a/../b.json", "/x.json", "x.json", "HTTPS://a.com/x"]:
+        assert master._resolve_url("https://site.com/data/", url) == master.urljoin("https://site.com/data/", url)
+
+def test_schemamap_directives_are_matched_per_line():
+    """Directives match case-insensitively at line start, and an empty value doesn't spill onto the next line"""
+    robots = b"User-agent: *\r\nSchemaMap: /a.xml\r\n  schemamap :http://x.com/b.xml\nschemaMap:\nDisallow: /c\n# schemaMap: /d.xml\n"
+    assert [m.group(1) for m in master.SCHEMAMAP_RE.finditer(robots)] == [b"/a.xml", b"http://x.com/b.xml"]
+
+def test_map_download_dropping_midway_skips_only_that_map(monkeypatch):
+    """A connection lost while streaming one map is logged and the other maps are still read"""
+    good_map = b'<urlset><url contentType="structuredData/schema.org"><loc>/a.json</loc></url></urlset>'
+
+    class DroppingRaw:
+        def __init__(self):
+            self.sent = False
+
+        def read(self, size=-1):
+            if self.sent:
+                raise master.urllib3.exceptions.ProtocolError("Connection broken: IncompleteRead")
+            self.sent = True
+            return b'<urlset><url contentType="structuredData/schema.org">'
+
+    class FakeResponse:
+        def __init__(self, status_code=200, content=b'', raw=None):
+            self.status_code = status_code
+            self.content = content
+            self.raw = raw
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    def fake_get(url, timeout=None, stream=False):
+        if url.endswith('/robots.txt'):
+            return FakeResponse(content=b"schemaMap: /broken.xml\nschemaMap: /good.xml\n")
+        if url.endswith('/broken.xml'):
+            return FakeResponse(raw=DroppingRaw())
+        return FakeResponse(raw=io.BytesIO(good_map))
+
+    monkeypatch.setattr(master._http_session, 'get', fake_get)
+    assert master.get_schema_urls_from_robots("http://site.com") == [
+        ("http://site.com", "http://site.com/good.xml", "http://site.com/a.json")
+    ]
+
+def test_process_site_syncs_all_maps_files_in_one_update(monkeypatch):
+    """Every map's files go to one site file update, so no map deactivates another's files"""
+    synced = []
+    monkeypatch.setattr(master, 'get_schema_urls_from_robots', lambda site_url: [
+        (site_url, 'a.xml', '1.json'), (site_url, 'a.xml', '2.json'),
+        (site_url, 'b.xml', '2.json'), (site_url, 'b.xml', '3.json'),
+    ])
+    monkeypatch.setattr(master, 'sync_site_files',
+                        lambda site_url, user_id, files: synced.append((user_id, files)) or (3, 3))
+
+    assert master.process_site('site.com', 'github:1')
+    assert synced == [('github:1', [
+        ('site.com', 'a.xml', '1.json'), ('site.com', 'a.xml', '2.json'), ('site.com', 'b.xml', '3.json'),
+    ])]
+
+def test_send_jobs_logs_each_job_outcome(monkeypatch):
+    """Jobs go out in one batch; those after the sent prefix are logged as failures"""
+    logged = []
+    monkeypatch.setattr(master, 'log_queue_operation',
+                        lambda operation, job, success=True, error=None: logged.append((job['file_url'], success)))
+
+    class FakeQueue:
+        def send_message_batch(self, jobs):
+            self.batch = jobs
+            return 1
+
+    queue = FakeQueue()
+    jobs = [{'file_url': 'a.json'}, {'file_url': 'b.json'}]
+    assert master._send_jobs(queue, [('queue_file', job) for job in jobs]) == 1
+    assert queue.batch == jobs
+    assert logged == [('a.json', True), ('b.json', False)]
+
+def test_job_sender_batches_queued_jobs(monkeypatch):
+    """Groups queued together go out in one send_message_batch call; each future gets its sent count"""
+    batches = []
+    monkeypatch.setattr(master, 'log_queue_operation', lambda *args, **kwargs: None)
+    monkeypatch.setattr(master, '_job_queue', master.Queue())
+
+    class FakeQueue:
+        def send_message_batch(self, jobs):
+            batches.append(jobs)
+            return 2  # Third job failed
+
+        def close(self):
+            self.closed = True
+
+    monkeypatch.setattr(master, 'get_queue', FakeQueue)
+    first = master.Future()
+    second = master.Future()
+    master._job_queue.put(([('queue_file', {'file_url': '0.json'})], first))
+    master._job_queue.put(([('queue_file', {'file_url': f'{i}.json'}) for i in (1, 2)], second))
+    master._job_queue.put(None)
+    master._job_sender_loop()
+
+    assert batches == [[{'file_url': '0.json'}, {'file_url': '1.json'}, {'file_url': '2.json'}]]
+    assert first.result() == 1
+    assert second.result() == 1
+
 if __name__ == "__main__":
     print("=" * 60)
     print("Testing Master.py with Schema Map Support")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Tests for the file-based queue implementation"""
+
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'core'))
+
+from queue_interface import FileQueue
+
+
+def test_file_queue_counters_track_job_lifecycle(tmp_path):
+    """Persistent counters follow send/receive/return/delete"""
+    queue = FileQueue(str(tmp_path))
+    queue.send_message({'type': 'process_file', 'file_url': 'a.json'})
+    queue.send_message({'type': 'process_file', 'file_url': 'b.json'})
+    assert queue.get_counts() == {'pending': 2, 'processing': 0}
+
+    message = queue.receive_message()
+    assert queue.get_counts() == {'pending': 1, 'processing': 1}
+
+    queue.return_message(message)
+    assert queue.get_counts() == {'pending': 2, 'processing': 0}
+
+    message = queue.receive_message()
+    queue.delete_message(message)
+    assert queue.get_counts() == {'pending': 1, 'processing': 0}
+
+
+def test_file_queue_counters_rebuilt_when_missing(tmp_path):
+    """Counters are recounted from disk if the counters file is missing"""
+    queue = FileQueue(str(tmp_path))
+    queue.send_message({'type': 'process_file'})
+    os.remove(os.path.join(str(tmp_path), FileQueue.COUNTERS_FILE))
+    assert queue.get_counts() == {'pending': 1, 'processing': 0}
+
+
+def test_file_queue_counters_reconciled_when_stale(tmp_path, monkeypatch):
+    """Drifted counters are trusted until due for reconciling, then recounted from disk"""
+    queue = FileQueue(str(tmp_path))
+    queue.send_message({'type': 'process_file'})
+    queue.get_counts()
+    # A process died after claiming a job but before adjusting the counters
+    message = queue.receive_message()
+    queue._update_counters(pending=1, processing=-1)
+    assert message is not None
+    assert queue.get_counts() == {'pending': 1, 'processing': 0}
+
+    monkeypatch.setattr(FileQueue, 'COUNTERS_RECONCILE_SECONDS', 0)
+    assert queue.get_counts() == {'pending': 0, 'processing': 1}
+
+
+def test_file_queue_send_message_batch(tmp_path):
+    """The default batch send enqueues every message and reports the count"""
+    queue = FileQueue(str(tmp_path))
+    sent = queue.send_message_batch([{'type': 'process_removed_file', 'file_url': f'{i}.json'} for i in range(3)])
+    assert sent == 3
+    assert queue.get_counts() == {'pending': 3, 'processing': 0}
+
+
+def test_file_queue_receives_oldest_first_and_skips_claimed(tmp_path):
+    """Buffered job names are claimed oldest first; ones another worker took are skipped"""
+    queue = FileQueue(str(tmp_path))
+    for i in range(3):
+        queue.send_message({'type': 'process_file', 'file_url': f'{i}.json'})
+
+    assert queue.receive_message().content['file_url'] == '0.json'
+    # Another worker claims the next job after it was buffered
+    os.rename(os.path.join(str(tmp_path), queue._pending_names[0]),
+              os.path.join(str(tmp_path), queue._pending_names[0] + '.processing'))
+    assert queue.receive_message().content['file_url'] == '2.json'
+    assert queue.receive_message() is None
@@ -199,7 +199,7 @@ def check_status():
     """Check the current system status"""
     try:
         # Get queue status
-        response = requests.get(f"{API_BASE}/queue/status")
+        response = requests.get(f"{API_BASE}/queue/status", params={"include_jobs": "true"})
         if response.status_code == 200:
             data = response.json()
             print("\n=== Queue Status ===")
@@ -13,7 +13,7 @@ API_BASE = "http://localhost:5001/api"  # Changed to 5001 to avoid macOS AirPlay
 def get_queue_status():
     """Get current queue status"""
     try:
-        response = requests.get(f"{API_BASE}/queue/status", timeout=2)
+        response = requests.get(f"{API_BASE}/queue/status", params={"include_jobs": "true"}, timeout=2)
         if response.status_code == 200:
             return response.json()
     except: